@@ -0,0 +1,260 @@
+# app/answer_archive.py
+#
+# Append-only archive of pipeline results (Parquet files).
+#
+# The request path only puts a dict on a queue. A background thread batches
+# rows and writes them as Parquet row groups, starting a new file once the
+# current one passes max_file_bytes or max_file_age_s. Analyse the files with
+# archive_stats.py.
+#
+# A Parquet file is unreadable until its footer is written on close, so the
+# open file has a hidden name (".answers-....parquet") and is renamed when it
+# is closed. Readers skip hidden files; a crash only loses the rows of the
+# file that was open (at most max_file_age_s worth).
+
+import atexit
+import json
+import os
+import queue
+import threading
+import time
+import uuid
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+STAGES = ["question", "omim", "ncbi_gene", "clinvar", "answer", "explain", "total"]
+
+# Flat columns so the stats CLI can scan just what it needs
+ARCHIVE_SCHEMA = pa.schema(
+    [
+        ("ts", pa.timestamp("ms", tz="UTC")),
+        ("question", pa.string()),
+        ("gene", pa.string()),
+        ("variant_hgvs", pa.string()),
+        ("variant_key", pa.string()),
+        ("query_type", pa.string()),
+        ("cache_status", pa.string()),
+        ("explanation_path", pa.string()),
+        ("question_json", pa.string()),
+        ("answer_json", pa.string()),
+    ]
+    + [(f"t_{stage}_ms", pa.float64()) for stage in STAGES]
+)
+
+DEFAULT_BATCH_SIZE = 1000
+DEFAULT_FLUSH_INTERVAL_S = 2.0
+DEFAULT_MAX_FILE_BYTES = 64 * 1024 * 1024
+DEFAULT_MAX_FILE_AGE_S = 60.0
+DEFAULT_MAX_QUEUE = 10000
+
+# Readers (pyarrow datasets) skip files starting with "." or "_"
+IN_PROGRESS_PREFIX = "."
+
+_STOP = object()
+
+
+def build_archive_row(
+    question: str,
+    question_json: dict,
+    answer_json: dict,
+    timings_ms: dict,
+    cache_status: str | None = None,
+) -> dict:
+    """
+    One archive row from a pipeline run.
+    timings_ms: { "question": 0.4, "omim": 310.2, ..., "total": 1234.5 }
+    """
+    gene = (question_json.get("gene") or {}).get("symbol")
+    variant = question_json.get("variant") or {}
+
+    row = {
+        "ts": int(time.time() * 1000),
+        "question": question,
+        "gene": gene,
+        "variant_hgvs": variant.get("hgvs"),
+        "variant_key": variant.get("canonical_key"),
+        "query_type": answer_json.get("answer_type"),
+        "cache_status": cache_status,
+        "explanation_path": answer_json.get("explanation_path"),
+        "question_json": json.dumps(question_json),
+        "answer_json": json.dumps(answer_json),
+    }
+    for stage in STAGES:
+        row[f"t_{stage}_ms"] = timings_ms.get(stage)
+    return row
+
+
+class AnswerArchive:
+    """
+    Background batched Parquet writer.
+
+    append() never blocks: if the queue is full the row is dropped
+    and counted in self.dropped.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        flush_interval_s: float = DEFAULT_FLUSH_INTERVAL_S,
+        max_file_bytes: int = DEFAULT_MAX_FILE_BYTES,
+        max_file_age_s: float = DEFAULT_MAX_FILE_AGE_S,
+        max_queue: int = DEFAULT_MAX_QUEUE,
+    ):
+        self.directory = directory
+        self.batch_size = batch_size
+        self.flush_interval_s = flush_interval_s
+        self.max_file_bytes = max_file_bytes
+        self.max_file_age_s = max_file_age_s
+
+        self.dropped = 0
+        self.written = 0
+
+        self._queue: queue.Queue = queue.Queue(maxsize=max_queue)
+        self._writer: pq.ParquetWriter | None = None
+        self._path: str | None = None
+        self._opened_at = 0.0
+
+        os.makedirs(directory, exist_ok=True)
+        self._thread = threading.Thread(
+            target=self._run, name="answer-archive", daemon=True
+        )
+        self._thread.start()
+
+    def append(self, row: dict) -> None:
+        try:
+            self._queue.put_nowait(row)
+        except queue.Full:
+            self.dropped += 1
+
+    def close(self, timeout: float | None = 10.0) -> None:
+        """Flush what is queued and close the current file."""
+        if not self._thread.is_alive():
+            return
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
+
+    # ----- background thread -----
+
+    def _run(self) -> None:
+        batch: list[dict] = []
+        next_flush = time.monotonic() + self.flush_interval_s
+
+        while True:
+            try:
+                item = self._queue.get(timeout=max(0.0, next_flush - time.monotonic()))
+            except queue.Empty:
+                item = None
+
+            if item is _STOP:
+                self._flush(batch)
+                self._close_file()
+                return
+
+            if item is not None:
+                batch.append(item)
+
+            if len(batch) >= self.batch_size or time.monotonic() >= next_flush:
+                self._flush(batch)
+                batch = []
+                next_flush = time.monotonic() + self.flush_interval_s
+
+                # Roll on age too, so rows become readable even when quiet
+                if (
+                    self._writer is not None
+                    and time.monotonic() - self._opened_at >= self.max_file_age_s
+                ):
+                    self._close_file()
+
+    def _flush(self, batch: list[dict]) -> None:
+        if not batch:
+            return
+        try:
+            table = pa.Table.from_pylist(batch, schema=ARCHIVE_SCHEMA)
+            if self._writer is None:
+                self._open_file()
+            self._writer.write_table(table)
+            self.written += len(batch)
+
+            if os.path.getsize(self._path) >= self.max_file_bytes:
+                self._close_file()
+        except Exception as e:
+            print(f"[ARCHIVE] Error writing {len(batch)} rows: {e}")
+
+    def _open_file(self) -> None:
+        name = f"answers-{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}.parquet"
+        self._path = os.path.join(self.directory, IN_PROGRESS_PREFIX + name)
+        self._writer = pq.ParquetWriter(self._path, ARCHIVE_SCHEMA, compression="zstd")
+        self._opened_at = time.monotonic()
+
+    def _close_file(self) -> None:
+        if self._writer is not None:
+            try:
+                self._writer.close()
+                done = os.path.basename(self._path)[len(IN_PROGRESS_PREFIX):]
+                os.replace(self._path, os.path.join(self.directory, done))
+            except Exception as e:
+                print(f"[ARCHIVE] Error closing {self._path}: {e}")
+            self._writer = None
+            self._path = None
+
+
+_ARCHIVE: AnswerArchive | None = None
+_ARCHIVE_LOCK = threading.Lock()
+
+
+def get_archive() -> AnswerArchive | None:
+    """
+    Shared archive writing to GENEGPT_ARCHIVE_DIR.
+    Returns None (archiving off) when the variable is not set.
+    """
+    global _ARCHIVE
+    directory = os.environ.get("GENEGPT_ARCHIVE_DIR")
+    if not directory:
+        return None
+
+    with _ARCHIVE_LOCK:
+        if _ARCHIVE is None:
+            _ARCHIVE = AnswerArchive(directory)
+            atexit.register(_ARCHIVE.close)
+    return _ARCHIVE
+
+
+# Tiny manual test: write some fake rows, then read them back
+if __name__ == "__main__":
+    import random
+    import tempfile
+
+    directory = tempfile.mkdtemp(prefix="genegpt-archive-")
+    n = 200_000
+    archive = AnswerArchive(
+        directory, batch_size=5000, max_file_bytes=2 * 1024 * 1024, max_queue=n
+    )
+
+    rng = random.Random(0)
+    genes = ["BRCA1", "BRCA2", "TP53", "CFTR", "MLH1", "EGFR", None]
+
+    start = time.perf_counter()
+    for i in range(n):
+        gene = rng.choice(genes)
+        timings = {stage: rng.lognormvariate(3, 1) for stage in STAGES}
+        archive.append(
+            build_archive_row(
+                question=f"What about {gene}?",
+                question_json={"gene": {"symbol": gene}, "variant": None},
+                answer_json={
+                    "answer_type": "gene_disease_summary",
+                    "explanation_path": rng.choice(["primary", "primary", "hedge", "template"]),
+                },
+                timings_ms=timings,
+                cache_status=rng.choice(["hit", "miss"]),
+            )
+        )
+    append_s = time.perf_counter() - start
+    archive.close(timeout=None)
+
+    files = sorted(os.listdir(directory))
+    print(f"append(): {append_s / n * 1e6:.1f} us/row on the request path")
+    print(f"written={archive.written} dropped={archive.dropped} files={len(files)}")
+    print(f"Run: python archive_stats.py {directory}")
@@ -95,6 +95,18 @@ def build_answer_json(evidence_json: Dict[str, Any]) -> Dict[str, Any]:
     # --------- Build key_points in simple, LLM-friendly form ---------
     kp: List[str] = answer_json["key_points"]
 
+    variant = evidence_json.get("variant") or {}
+    conflict = variant.get("gene_conflict")
+    if conflict:
+        if conflict["variant_genes"]:
+            where = f"lies in {', '.join(conflict['variant_genes'])}, not"
+        else:
+            where = "is not"
+        kp.append(
+            f"The variant you gave {where} in {conflict['named_gene']}; "
+            "please check which gene you meant."
+        )
+
     if classification:
         kp.append(
             f"This variant is classified as '{classification}' in ClinVar for gene {gene_symbol}."
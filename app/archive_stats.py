@@ -0,0 +1,149 @@
+# app/archive_stats.py
+#
+# Query-log analytics over the answer archive (see answer_archive.py).
+#
+#   python archive_stats.py /path/to/archive_dir
+#   python archive_stats.py /path/to/archive_dir --top 20 --since 2026-01-01
+#
+# Only the columns needed are read, and every number is computed with
+# Arrow compute kernels (no Python loop over rows).
+
+import argparse
+import time
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+
+from answer_archive import ARCHIVE_SCHEMA, IN_PROGRESS_PREFIX, STAGES
+
+PERCENTILES = [0.5, 0.9, 0.95, 0.99]
+
+
+def load_archive(directory: str, since: str | None = None) -> pa.Table:
+    # Explicit schema: an empty (fresh) archive still has every column, and
+    # older files missing newer columns (variant_key) read them as null.
+    # The file being written is hidden (IN_PROGRESS_PREFIX); anything else
+    # without a valid footer (e.g. left by an older version) is skipped.
+    dataset = ds.dataset(
+        directory,
+        format="parquet",
+        schema=ARCHIVE_SCHEMA,
+        ignore_prefixes=[IN_PROGRESS_PREFIX, "_"],
+        exclude_invalid_files=True,
+    )
+    columns = ["gene", "cache_status", "explanation_path"] + [
+        f"t_{stage}_ms" for stage in STAGES
+    ]
+
+    row_filter = None
+    if since:
+        row_filter = ds.field("ts") >= pa.scalar(
+            pc.strptime(since, format="%Y-%m-%d", unit="ms").as_py(),
+            type=pa.timestamp("ms", tz="UTC"),
+        )
+
+    return dataset.to_table(columns=columns, filter=row_filter)
+
+
+def gene_popularity(table: pa.Table, top: int) -> list[tuple[str, int]]:
+    counts = pc.value_counts(table["gene"].drop_null())
+    if len(counts) == 0:
+        return []
+    values = counts.field("values")
+    totals = counts.field("counts")
+    order = pc.sort_indices(totals, sort_keys=[("", "descending")])[:top]
+    return list(
+        zip(pc.take(values, order).to_pylist(), pc.take(totals, order).to_pylist())
+    )
+
+
+def share_by_value(table: pa.Table, column: str) -> dict[str, float]:
+    """Fraction of rows per value (null shown as "none")."""
+    n = table.num_rows
+    if n == 0:
+        return {}
+    counts = pc.value_counts(pc.fill_null(table[column], "none"))
+    return {
+        value: count / n
+        for value, count in zip(
+            counts.field("values").to_pylist(), counts.field("counts").to_pylist()
+        )
+    }
+
+
+def latency_percentiles(table: pa.Table) -> dict[str, list[float]]:
+    result = {}
+    for stage in STAGES:
+        column = table[f"t_{stage}_ms"]
+        if column.null_count == len(column):
+            continue
+        result[stage] = pc.quantile(column, q=PERCENTILES).to_pylist()
+    return result
+
+
+def slowest_genes(table: pa.Table, top: int, min_requests: int = 10) -> list[dict]:
+    """Genes with the highest p95 total latency."""
+    grouped = (
+        table.filter(pc.is_valid(table["gene"]))
+        .group_by("gene")
+        .aggregate(
+            [
+                ("t_total_ms", "count"),
+                ("t_total_ms", "tdigest", pc.TDigestOptions(q=0.95)),
+            ]
+        )
+    )
+    grouped = grouped.filter(pc.greater_equal(grouped["t_total_ms_count"], min_requests))
+    p95 = pc.list_element(grouped["t_total_ms_tdigest"], 0)
+    order = pc.sort_indices(p95, sort_keys=[("", "descending")])[:top]
+    return [
+        {"gene": gene, "requests": count, "p95_ms": value}
+        for gene, count, value in zip(
+            pc.take(grouped["gene"], order).to_pylist(),
+            pc.take(grouped["t_total_ms_count"], order).to_pylist(),
+            pc.take(p95, order).to_pylist(),
+        )
+    ]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="GeneGPT answer archive statistics")
+    parser.add_argument("directory", help="archive directory (GENEGPT_ARCHIVE_DIR)")
+    parser.add_argument("--top", type=int, default=10, help="rows in top-N lists")
+    parser.add_argument("--since", help="only rows on/after this date (YYYY-MM-DD)")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    table = load_archive(args.directory, args.since)
+    load_s = time.perf_counter() - start
+
+    print(f"Rows: {table.num_rows:,} (loaded in {load_s:.2f}s)\n")
+    if table.num_rows == 0:
+        return
+
+    print(f"Top {args.top} genes:")
+    for gene, count in gene_popularity(table, args.top):
+        print(f"  {gene:<10} {count:>10,}  {count / table.num_rows:6.1%}")
+
+    print("\nCache status:")
+    for value, share in sorted(share_by_value(table, "cache_status").items()):
+        print(f"  {value:<10} {share:6.1%}")
+
+    print("\nExplanation path:")
+    for value, share in sorted(share_by_value(table, "explanation_path").items()):
+        print(f"  {value:<10} {share:6.1%}")
+
+    print("\nLatency (ms):  " + "  ".join(f"{f'p{int(q * 100)}':>9}" for q in PERCENTILES))
+    for stage, values in latency_percentiles(table).items():
+        print(f"  {stage:<11}" + "  ".join(f"{v:9.1f}" for v in values))
+
+    print("\nSlowest genes (p95 total):")
+    for row in slowest_genes(table, args.top):
+        print(f"  {row['gene']:<10} {row['p95_ms']:9.1f} ms  ({row['requests']:,} requests)")
+
+    print(f"\nDone in {time.perf_counter() - start:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
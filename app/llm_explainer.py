@@ -1,18 +1,52 @@
 import json
-from openai import OpenAI
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 
-client = OpenAI(api_key=st.secrets["OPENAI_API_KEY"])
+from openai import APITimeoutError, OpenAI
 
-def explain_answer_json(answer_json: dict) -> str:
+PRIMARY_MODEL = "gpt-4o-mini"   # you can change to another model if you want
+HEDGE_MODEL = None              # None = hedge with the same model
+
+# Total time we give the LLM before falling back to the template text
+DEFAULT_BUDGET_S = 8.0
+
+# Hedge when the primary call is slower than this percentile of recent calls
+HEDGE_PERCENTILE = 0.95
+# ...but before we have enough samples, use this fixed threshold
+DEFAULT_HEDGE_AFTER_S = 2.0
+MIN_LATENCY_SAMPLES = 20
+LATENCY_WINDOW = 200
+
+_client = None
+_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="llm-explainer")
+
+_latencies: list[float] = []
+_latencies_lock = threading.Lock()
+
+
+def _get_openai_client() -> OpenAI:
     """
-    Take Final Answer JSON (Layer 3) and ask an LLM
-    to explain it in clear, natural language.
-    Style: student-friendly, calm, not too technical.
+    Create the OpenAI client on first use.
+    Key comes from OPENAI_API_KEY, or Streamlit secrets when running in the UI.
     """
+    global _client
+    if _client is None:
+        api_key = os.environ.get("OPENAI_API_KEY")
+        if not api_key:
+            import streamlit as st
+            api_key = st.secrets["OPENAI_API_KEY"]
+        # No SDK retries: hedging replaces them, and retried timeouts would
+        # keep abandoned calls holding _executor threads past the budget.
+        _client = OpenAI(api_key=api_key, max_retries=0)
+    return _client
 
+
+def _build_messages(answer_json: dict) -> list[dict]:
     json_text = json.dumps(answer_json, indent=2)
 
-    messages = [
+    return [
         {
             "role": "system",
             "content": (
@@ -35,15 +69,246 @@ def explain_answer_json(answer_json: dict) -> str:
         },
     ]
 
+
+def _complete(client: OpenAI, model: str, messages: list[dict], timeout: float | None) -> str:
     response = client.chat.completions.create(
-        model="gpt-4o-mini",   # you can change to another model if you want
+        model=model,
         messages=messages,
         temperature=0.2,       # keep it stable, not too creative
+        timeout=timeout,
     )
-
     return response.choices[0].message.content.strip()
 
 
+def _complete_by(client: OpenAI, model: str, messages: list[dict], deadline: float) -> str:
+    """
+    _complete() with whatever is left until deadline when the call starts,
+    not when it was queued: under load a call can wait on _executor, and
+    must not then run for a full budget after its caller has given up.
+    """
+    timeout = deadline - time.monotonic()
+    if timeout <= 0:
+        raise TimeoutError("deadline passed before the request started")
+    return _complete(client, model, messages, timeout)
+
+
+def explain_answer_json(answer_json: dict) -> str:
+    """
+    Take Final Answer JSON (Layer 3) and ask an LLM
+    to explain it in clear, natural language.
+    Style: student-friendly, calm, not too technical.
+
+    Single blocking call, no deadline. The pipeline uses
+    explain_with_deadline() instead.
+    """
+    return _complete(
+        _get_openai_client(), PRIMARY_MODEL, _build_messages(answer_json), timeout=None
+    )
+
+
+def _record_latency(seconds: float) -> None:
+    with _latencies_lock:
+        _latencies.append(seconds)
+        if len(_latencies) > LATENCY_WINDOW:
+            del _latencies[0]
+
+
+def hedge_threshold() -> float:
+    """
+    Seconds to wait for the primary call before sending the hedge request:
+    the HEDGE_PERCENTILE of recent successful call latencies.
+    """
+    with _latencies_lock:
+        samples = sorted(_latencies)
+    if len(samples) < MIN_LATENCY_SAMPLES:
+        return DEFAULT_HEDGE_AFTER_S
+    idx = min(len(samples) - 1, int(len(samples) * HEDGE_PERCENTILE))
+    return samples[idx]
+
+
+def template_explanation(answer_json: dict) -> str:
+    """
+    Deterministic explanation built locally from the answer JSON.
+    Used when the LLM misses the deadline or fails. Only restates
+    what is already in key_points / suggested_next_steps.
+    """
+    gene = answer_json.get("gene")
+    variant = answer_json.get("variant")
+    if isinstance(variant, dict):
+        variant = variant.get("hgvs")
+
+    if gene and variant:
+        intro = f"Here is a summary of what we found for {gene} {variant}."
+    elif gene:
+        intro = f"Here is a summary of what we found for the {gene} gene."
+    else:
+        intro = "Here is a summary of what we found."
+
+    lines = [intro, ""]
+
+    key_points = answer_json.get("key_points") or []
+    if key_points:
+        lines.extend(f"- {point}" for point in key_points)
+    else:
+        lines.append("- We could not find enough information to summarize this result.")
+
+    next_steps = answer_json.get("suggested_next_steps") or []
+    if next_steps:
+        lines.append("")
+        lines.append("Suggested next steps:")
+        lines.extend(f"- {step}" for step in next_steps)
+
+    lines.append("")
+    lines.append(
+        "This summary was generated automatically and is not medical advice. "
+        "Please discuss your results with a genetic counselor or doctor."
+    )
+
+    return "\n".join(lines)
+
+
+def explain_with_deadline(
+    answer_json: dict,
+    budget_s: float = DEFAULT_BUDGET_S,
+    hedge_after_s: float | None = None,
+    hedge_model: str | None = HEDGE_MODEL,
+    client: OpenAI | None = None,
+) -> tuple[str, str]:
+    """
+    Explain answer_json within budget_s seconds.
+
+    1) Send the primary request.
+    2) If it has not answered after hedge_after_s (default: p95 of recent
+       calls), send a second "hedge" request, optionally to hedge_model,
+       and take whichever finishes first.
+    3) If nothing succeeds before the deadline, return template_explanation().
+
+    Returns (explanation_text, path) where path is
+    "primary", "hedge" or "template".
+    """
+    if client is None:
+        try:
+            client = _get_openai_client()
+        except Exception as e:
+            print(f"[LLM] Could not create client: {e}")
+            return template_explanation(answer_json), "template"
+    if hedge_after_s is None:
+        hedge_after_s = hedge_threshold()
+
+    messages = _build_messages(answer_json)
+    start = time.monotonic()
+    deadline = start + budget_s
+
+    def remaining() -> float:
+        return max(0.0, deadline - time.monotonic())
+
+    def submit(model: str):
+        # Each request times out at the deadline, so abandoned calls
+        # don't keep a worker thread busy for long.
+        return _executor.submit(_complete_by, client, model, messages, deadline)
+
+    def record_primary_latency(future) -> None:
+        # Sampled even when the hedge wins. A primary that timed out (or
+        # never started) counts as at least the budget: leaving those out
+        # would bias the percentile, and so the hedge threshold, low.
+        if future.cancelled() or isinstance(
+            future.exception(), (TimeoutError, APITimeoutError)
+        ):
+            _record_latency(max(budget_s, time.monotonic() - start))
+        elif future.exception() is None:
+            _record_latency(time.monotonic() - start)
+
+    primary = submit(PRIMARY_MODEL)
+    primary.add_done_callback(record_primary_latency)
+
+    pending = {primary: "primary"}
+    hedged = False
+
+    while pending and remaining() > 0:
+        if hedged:
+            timeout = remaining()
+        else:
+            timeout = min(remaining(), max(0.0, start + hedge_after_s - time.monotonic()))
+
+        done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+
+        for future in done:
+            path = pending.pop(future)
+            try:
+                text = future.result()
+            except Exception as e:
+                print(f"[LLM] {path} request failed: {e}")
+                continue
+            return text, path
+
+        # Hedge when the primary is slow, or right away if it already failed
+        if not hedged and remaining() > 0 and (
+            not pending or time.monotonic() - start >= hedge_after_s
+        ):
+            pending[submit(hedge_model or PRIMARY_MODEL)] = "hedge"
+            hedged = True
+
+    for future in pending:
+        future.cancel()
+
+    return template_explanation(answer_json), "template"
+
+
+def _start_fake_llm_server(latencies: list[float]):
+    """
+    Local stand-in for the chat completions endpoint.
+    Each request sleeps for the next value in latencies (cycled),
+    so we can inject tail latency.
+    """
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    counter = {"n": 0}
+    lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            with lock:
+                delay = latencies[counter["n"] % len(latencies)]
+                counter["n"] += 1
+            time.sleep(delay)
+
+            payload = json.dumps(
+                {
+                    "id": "fake",
+                    "object": "chat.completion",
+                    "created": int(time.time()),
+                    "model": body["model"],
+                    "choices": [
+                        {
+                            "index": 0,
+                            "finish_reason": "stop",
+                            "message": {
+                                "role": "assistant",
+                                "content": f"Explanation from {body['model']} "
+                                           f"after {delay:.2f}s.",
+                            },
+                        }
+                    ],
+                }
+            ).encode()
+            try:
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+            except (BrokenPipeError, ConnectionResetError):
+                pass  # client gave up (timeout)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
 # Tiny manual test (optional)
 if __name__ == "__main__":
     demo_answer = {
@@ -66,4 +331,36 @@ if __name__ == "__main__":
         }
     }
 
-    print(explain_answer_json(demo_answer))
+    # Fake endpoint: most calls are fast, every 5th one hits a 3s tail
+    server = _start_fake_llm_server([0.05, 0.05, 0.05, 0.05, 3.0])
+    fake_client = OpenAI(
+        api_key="fake",
+        base_url=f"http://127.0.0.1:{server.server_port}/v1",
+        max_retries=0,
+    )
+
+    paths: dict[str, int] = {}
+    timings = []
+    for i in range(20):
+        t0 = time.monotonic()
+        text, path = explain_with_deadline(
+            demo_answer, budget_s=1.0, hedge_after_s=0.2, client=fake_client
+        )
+        timings.append(time.monotonic() - t0)
+        paths[path] = paths.get(path, 0) + 1
+
+    timings.sort()
+    print("Paths served:", paths)
+    print(f"p50 {timings[len(timings) // 2]:.2f}s, max {timings[-1]:.2f}s (budget 1.0s)")
+
+    # Every call slow -> deadline passes -> template explanation
+    slow_server = _start_fake_llm_server([5.0])
+    slow_client = OpenAI(
+        api_key="fake",
+        base_url=f"http://127.0.0.1:{slow_server.server_port}/v1",
+        max_retries=0,
+    )
+    text, path = explain_with_deadline(
+        demo_answer, budget_s=0.5, hedge_after_s=0.1, client=slow_client
+    )
+    print(f"\nAll-slow endpoint served by: {path}\n{text}")
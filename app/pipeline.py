@@ -1,11 +1,23 @@
 # app/pipeline.py
 
+import time
+
 from question_parser import build_question_json
 from omim_client import fetch_and_filter_omim
 from clinvar_client import fetch_and_filter_clinvar
 from ncbi_gene_client import fetch_gene_info
 from answer_builder import build_answer_json
-from llm_explainer import explain_answer_json
+from llm_explainer import explain_with_deadline
+from answer_archive import build_archive_row, get_archive
+from utils.symbol_index import get_symbol_index
+
+# Build the symbol index at startup, not on the first question: with the
+# HGNC set (GENE_SYMBOLS_PATH) that takes a few seconds
+get_symbol_index()
+
+
+def _elapsed_ms(start: float) -> float:
+    return (time.perf_counter() - start) * 1000
 
 
 def run_genegpt_pipeline(user_question: str) -> tuple[dict, str]:
@@ -20,26 +32,40 @@ def run_genegpt_pipeline(user_question: str) -> tuple[dict, str]:
       2) Evidence JSON (OMIM + NCBI Gene + ClinVar)
       3) Final Answer JSON (clean, structured)
       4) Natural-language explanation from LLM
+
+    If GENEGPT_ARCHIVE_DIR is set, every run is also appended to the
+    answer archive (non-blocking, see answer_archive.py).
     """
 
+    timings_ms: dict[str, float] = {}
+    t_start = time.perf_counter()
+
     # ----- Layer 1: Question JSON -----
+    t0 = time.perf_counter()
     question_json = build_question_json(user_question)
+    timings_ms["question"] = _elapsed_ms(t0)
 
     gene_symbol = question_json["gene"]["symbol"]
     variant_block = question_json["variant"]  # may be None
 
     # ----- Layer 2a: OMIM (gene ↦ diseases) -----
+    t0 = time.perf_counter()
     omim_evidence = fetch_and_filter_omim(gene_symbol)
+    timings_ms["omim"] = _elapsed_ms(t0)
 
     # ----- Layer 2b: NCBI Gene (gene metadata) -----
+    t0 = time.perf_counter()
     ncbi_gene_info = fetch_gene_info(gene_symbol)
+    timings_ms["ncbi_gene"] = _elapsed_ms(t0)
 
     # ----- Layer 2c: ClinVar (variant classification), only if variant present -----
     if variant_block is not None and variant_block.get("hgvs") is not None:
+        t0 = time.perf_counter()
         clinvar_evidence = fetch_and_filter_clinvar(
             gene_symbol=gene_symbol,
             variant_hgvs=variant_block["hgvs"],
         )
+        timings_ms["clinvar"] = _elapsed_ms(t0)
     else:
         clinvar_evidence = None
 
@@ -57,10 +83,31 @@ def run_genegpt_pipeline(user_question: str) -> tuple[dict, str]:
     }
 
     # ----- Layer 3: Final Answer JSON (what the LLM sees) -----
+    t0 = time.perf_counter()
     answer_json = build_answer_json(evidence_json)
+    timings_ms["answer"] = _elapsed_ms(t0)
 
     # ----- Layer 4: Natural-language explanation -----
-    explanation_text = explain_answer_json(answer_json)
+    # Deadline-bound: hedged LLM call, template text if the LLM is too slow.
+    t0 = time.perf_counter()
+    explanation_text, explanation_path = explain_with_deadline(answer_json)
+    answer_json["explanation_path"] = explanation_path  # primary / hedge / template
+    timings_ms["explain"] = _elapsed_ms(t0)
+
+    timings_ms["total"] = _elapsed_ms(t_start)
+
+    # ----- Archive (background write, never blocks the answer) -----
+    archive = get_archive()
+    if archive is not None:
+        archive.append(
+            build_archive_row(
+                question=user_question,
+                question_json=question_json,
+                answer_json=answer_json,
+                timings_ms=timings_ms,
+                cache_status="none",  # no caching layer in v1 yet
+            )
+        )
 
     # Return BOTH: structured JSON + friendly text
     return answer_json, explanation_text
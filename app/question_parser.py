@@ -1,34 +1,309 @@
 import re
-from utils.gene_utils import extract_gene_symbol
+from utils.gene_utils import extract_gene_tokens, looks_like_symbol
+from utils.symbol_index import get_symbol_index
+from utils.transcript_index import (
+    canonicalize_variant,
+    genomic_position_key,
+    get_transcript_index,
+)
 
+# c. variant, optionally with its transcript: NM_007294.4:c.68_69delAG
+# Positions may be UTR (c.-20, c.*5) or intronic (c.68+2).
+_C_POS = r"[-*]?[0-9]+(?:[+-][0-9]+)?"
 HGVS_PATTERN = re.compile(
-    r"(c\.[0-9_]+[ACGTacgt]+>[ACGTacgt]+|c\.[0-9_]+del[ACGTacgt]+|c\.[0-9_]+ins[ACGTacgt]+)"
+    r"(?:(?P<transcript>N[MR]_[0-9]+(?:\.[0-9]+)?):)?"
+    rf"(?P<hgvs>c\.(?P<positions>{_C_POS}(?:_{_C_POS})?)"
+    r"(?P<change>[ACGTacgt]+>[ACGTacgt]+|delins[ACGTacgt]+|del(?!ins)[ACGTacgt]*"
+    r"|ins[ACGTacgt]+))"
 )
 
-def build_question_json(user_question: str) -> dict:
+# Bare genomic position: chr17:43094464
+GENOMIC_PATTERN = re.compile(r"\bchr([0-9]{1,2}|[XYM]):([0-9]+)\b", re.IGNORECASE)
+
+
+def resolve_gene_symbol(user_question: str) -> dict:
     """
-    Extract gene symbol + variant from user question.
+    Pick the gene for the question, fixing typos like BRAC1 -> BRCA1.
+
+    - Only tokens written like a symbol are considered (digits or capitals,
+      see looks_like_symbol), so "heart" never competes with DMD; if none
+      is, every token is.
+    - An exact approved symbol wins, then an exact alias, then the first
+      remaining token in question order, corrected if the index can
+      ("Can BRAC1 cause cancer?" gives BRCA1). Tokens with a digit go
+      before those without.
+    - If the best match is shared by several genes, symbol is None and
+      "ambiguous" is True (we don't guess).
+    - With the built-in symbol list nothing is corrected (see
+      SymbolIndex): an unknown token is passed on as written.
     """
+    index = get_symbol_index()
+    tokens = extract_gene_tokens(user_question)
 
-    user_question = user_question.strip()
+    if not tokens:
+        return {
+            "input": None,
+            "symbol": None,
+            "corrected": False,
+            "distance": None,
+            "ambiguous": False,
+            "candidates": [],
+        }
 
-    # --- 1) Extract gene ---
-    gene_symbol = extract_gene_symbol(user_question)
+    candidates = [t for t, written in tokens if looks_like_symbol(written)]
+    if not candidates:
+        candidates = [t for t, _ in tokens]
 
-    # --- 2) Extract HGVS variant ---
-    hgvs_match = HGVS_PATTERN.search(user_question)
+    best = None
+    best_rank = None
+    for position, token in enumerate(candidates):
+        result = index.correct(token)
+        rank = (_match_tier(result, token), result["ambiguous"], position)
+        if best_rank is None or rank < best_rank:
+            best, best_rank = result, rank
+    return best
+
+
+def _match_tier(result: dict, token: str) -> int:
+    if result["distance"] == 0:
+        if not result["corrected"] and not result["ambiguous"]:
+            return 0  # approved symbol
+        return 1  # alias
+    # Typo or unknown gene: a digit makes it more likely to be a gene
+    return 2 if any(c.isdigit() for c in token) else 3
+
+
+def _gene_from_position(chrom: str, pos: int) -> dict | None:
+    """
+    Gene(s) overlapping a genomic position, in the same shape as
+    resolve_gene_symbol(). None if no transcript index is loaded or
+    nothing overlaps the position.
+    """
+    index = get_transcript_index()
+    if index is None:
+        return None
+
+    genes = index.genes_at(chrom, pos)
+    if not genes:
+        return None
+    return {
+        "input": f"chr{chrom}:{pos}",
+        "symbol": genes[0] if len(genes) == 1 else None,
+        "corrected": False,
+        "distance": None,
+        "ambiguous": len(genes) > 1,
+        "candidates": genes,
+    }
+
+
+def _gene_from_transcript(transcript: str) -> dict | None:
+    """Gene of a transcript accession (NM_007294.4), like _gene_from_position()."""
+    index = get_transcript_index()
+    t = index.transcript_id(transcript) if index is not None else None
+    if t is None:
+        return None
+    return {
+        "input": transcript,
+        "symbol": index.genes[t],
+        "corrected": False,
+        "distance": None,
+        "ambiguous": False,
+        "candidates": [index.genes[t]],
+    }
+
+
+def build_variant_block(user_question: str, gene_symbol: str | None) -> dict | None:
+    """
+    Find the variant in the question and, when a transcript index is
+    loaded, attach genomic coordinates + a transcript-independent key:
+
+    {
+        "hgvs": "c.68_69delAG",
+        "type": "DNA",
+        "transcript": "NM_007294.4",
+        "c_position": "c.68_69",
+        "genomic": {"chrom": "chr17", "start": 43124027, "end": 43124028},
+        "canonical_key": "chr17:g.43124027_43124028del",
+        "gene_conflict": None
+    }
 
-    variant_block = None
+    A bare position (chr17:43094464) gives the same keys with type
+    "genomic_position", hgvs None and c_position on the gene's transcript.
+
+    If the variant lies in another gene than the one named (its transcript
+    belongs to another gene, or the named gene doesn't cover the position),
+    gene_conflict is {"named_gene": "TP53", "variant_genes": ["BRCA1"]}
+    and nothing is placed on the named gene. A conflicting transcript
+    also gets no coordinates/key (we don't know which one was meant);
+    a position keeps its own.
+    """
+    index = get_transcript_index()
+
+    hgvs_match = HGVS_PATTERN.search(user_question)
     if hgvs_match:
         variant_block = {
-            "hgvs": hgvs_match.group(0),
-            "type": "DNA"
+            "hgvs": hgvs_match.group("hgvs"),
+            "type": "DNA",
+            "transcript": hgvs_match.group("transcript"),
+            "c_position": f"c.{hgvs_match.group('positions')}",
+            "genomic": None,
+            "canonical_key": None,
+            "gene_conflict": None,
+        }
+        if index is not None:
+            coords = canonicalize_variant(
+                index,
+                gene_symbol,
+                hgvs_match.group("positions"),
+                hgvs_match.group("change"),
+                transcript=hgvs_match.group("transcript"),
+            )
+            explicit = hgvs_match.group("transcript")
+            if (
+                coords is not None
+                and explicit
+                and gene_symbol
+                and coords["gene"].upper() != gene_symbol.upper()
+            ):
+                variant_block["gene_conflict"] = {
+                    "named_gene": gene_symbol,
+                    "variant_genes": [coords["gene"]],
+                }
+            elif coords is not None:
+                variant_block["transcript"] = coords["transcript"]
+                variant_block["genomic"] = {
+                    "chrom": coords["chrom"],
+                    "start": coords["start"],
+                    "end": coords["end"],
+                }
+                variant_block["canonical_key"] = coords["canonical_key"]
+        return variant_block
+
+    genomic_match = GENOMIC_PATTERN.search(user_question)
+    if genomic_match:
+        chrom = f"chr{genomic_match.group(1).upper()}"
+        pos = int(genomic_match.group(2))
+        variant_block = {
+            "hgvs": None,
+            "type": "genomic_position",
+            "transcript": None,
+            "c_position": None,
+            "genomic": {"chrom": chrom, "start": pos, "end": pos},
+            "canonical_key": genomic_position_key(chrom, pos),
+            "gene_conflict": None,
         }
+        t = index.default_transcript(gene_symbol) if index is not None else None
+        if t is None:
+            return variant_block
+
+        genes = index.genes_at(chrom, pos)
+        if gene_symbol.upper() not in {g.upper() for g in genes}:
+            variant_block["gene_conflict"] = {
+                "named_gene": gene_symbol,
+                "variant_genes": genes,
+            }
+            return variant_block
+
+        # Also express it on the gene's default transcript (c. position)
+        try:
+            variant_block["c_position"] = f"c.{index.genomic_to_c(t, pos)}"
+            variant_block["transcript"] = index.names[t]
+        except ValueError:
+            pass  # another of the gene's transcripts covers it, not this one
+        return variant_block
+
+    return None
+
+
+def build_question_json(user_question: str) -> dict:
+    """
+    Extract gene symbol + variant from user question.
+    """
+
+    user_question = user_question.strip()
+
+    # --- 1) Extract gene (with spelling correction) ---
+    gene_match = resolve_gene_symbol(user_question)
+
+    # Gene word isn't a known symbol ("Is chr17:1100 pathogenic?"): use the
+    # gene at the bare position, or the gene of the variant's transcript
+    index = get_transcript_index()
+    symbol = gene_match["symbol"]
+    known = bool(symbol) and (
+        get_symbol_index().is_known(symbol)
+        or (index is not None and index.default_transcript(symbol) is not None)
+    )
+    if index is not None and not known:
+        genomic_match = GENOMIC_PATTERN.search(user_question)
+        hgvs_match = HGVS_PATTERN.search(user_question)
+        if hgvs_match and hgvs_match.group("transcript"):
+            gene_match = _gene_from_transcript(hgvs_match.group("transcript")) or gene_match
+        elif genomic_match:
+            gene_match = _gene_from_position(
+                genomic_match.group(1).upper(), int(genomic_match.group(2))
+            ) or gene_match
+
+    # --- 2) Extract HGVS variant / genomic position ---
+    variant_block = build_variant_block(user_question, gene_match["symbol"])
 
     return {
         "raw_question": user_question,
         "gene": {
-            "symbol": gene_symbol
+            "input": gene_match["input"],
+            "symbol": gene_match["symbol"],
+            "spelling": {
+                "corrected": gene_match["corrected"],
+                "distance": gene_match["distance"],
+                "ambiguous": gene_match["ambiguous"],
+                "candidates": gene_match["candidates"],
+            },
         },
         "variant": variant_block
     }
+
+
+# Tiny manual test: real genes outside the built-in list must pass through
+if __name__ == "__main__":
+    import utils.symbol_index as symbol_index
+
+    passthrough = [
+        ("What does TP63 do?", "TP63"),
+        ("Tell me about MLH3", "MLH3"),
+        ("What does ATR do?", "ATR"),
+        ("Is APOE linked to Alzheimer's?", "APOE"),
+        ("What is GBA?", "GBA"),
+        ("Is the SMN1 deletion serious?", "SMN1"),
+        ("Are APP variants pathogenic?", "APP"),
+        ("What does ABCA4 do?", "ABCA4"),
+        ("Tell me about MYH9", "MYH9"),
+        ("Is HRAS an oncogene?", "HRAS"),
+        ("What does SMAD2 do?", "SMAD2"),
+        ("Tell me about MSH3", "MSH3"),
+        ("Is FANCA linked to anemia?", "FANCA"),
+        ("Is DMD linked to heart disease?", "DMD"),
+        ("Can BRCA1 cause cancer?", "BRCA1"),
+    ]
+    typos = [
+        ("Can BRAC1 cause cancer?", "BRCA1"),
+        ("Why is CTFR linked to cystic fibrosis?", "CFTR"),
+        ("Should I worry about TP35?", "TP53"),
+        ("is brac1 serious", "BRCA1"),
+    ]
+
+    def check(label, cases):
+        failed = 0
+        for question, expected in cases:
+            got = resolve_gene_symbol(question)["symbol"]
+            if got != expected:
+                failed += 1
+                print(f"  FAIL {question!r}: {got} (expected {expected})")
+        print(f"{label}: {len(cases) - failed}/{len(cases)} ok")
+
+    # Built-in list: nothing is corrected, typos pass through too
+    check("built-in list", passthrough + [("Can BRAC1 cause cancer?", "BRAC1")])
+
+    # Stand-in for the HGNC set: the built-in list plus the genes above
+    complete = dict(symbol_index.DEFAULT_GENE_SYMBOLS)
+    complete.update({expected: [] for _, expected in passthrough})
+    symbol_index._INDEX = symbol_index.SymbolIndex(complete, complete=True)
+    check("complete set", passthrough + typos)
@@ -79,6 +79,11 @@ Type your question in **natural language**.
         # ----- Explanation block -----
         st.markdown("### 📝 Explanation")
         st.write(explanation_text)
+        if answer_json.get("explanation_path") == "template":
+            st.caption(
+                "The language model did not answer in time, so this is a "
+                "shorter automatic summary of the same results."
+            )
 
         # ----- Technical details (JSON) -----
         with st.expander("🔍 Technical details (JSON view)", expanded=False):
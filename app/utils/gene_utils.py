@@ -6,32 +6,42 @@ BLACKLIST = {
     "GENE", "ABOUT", "CONDITIONS", "ASSOCIATED",
     "WITH", "MUTATION", "SERIOUS", "EXPLAIN",
     "VARIANT", "MEANING", "RISK", "LINKED",
-    "TO", "IN", "MY", "TEST", "RESULTS"
+    "TO", "IN", "MY", "TEST", "RESULTS",
+    # Common question words that typo correction would otherwise
+    # happily "fix" into a gene (WHERE -> EGFR, ...)
+    "HAVE", "THIS", "THAT", "WHERE", "THERE", "WHICH", "KIND",
+    "CARRY", "FOUND", "SAID", "DOCTOR", "CANCER", "DISEASE", "DISEASES",
+    "NORMALLY", "FAMILY", "PLEASE", "TELL",
 }
 
-def extract_gene_symbol(user_question: str) -> str | None:
-    """
-    Extract gene symbols from a user question.
+# Match gene-like tokens (BRCA1, TP53, CFTR, EGFR, MSH2, etc.)
+GENE_PATTERN = re.compile(r"\b[A-Za-z0-9]{3,10}\b")
 
-    Supports case-insensitive detection:
-    - BRCA1
-    - brca1
-    - Brca1
-    Ignores English words using a blacklist.
-    """
+# Tokens from genomic positions (chr17:43094464) that look gene-like
+NOT_A_GENE_PATTERN = re.compile(r"^(CHR[0-9XYM]{1,2}|[0-9]+)$")
 
-    # Make everything uppercase to match patterns easily
-    text_upper = user_question.upper()
 
-    # Match gene-like tokens (BRCA1, TP53, CFTR, EGFR, MSH2, etc.)
-    gene_pattern = r"\b[A-Z0-9]{3,10}\b"
+def extract_gene_tokens(user_question: str) -> list[tuple[str, str]]:
+    """
+    Gene-like tokens in the question, in order, as (uppercased, as written)
+    pairs, with blacklisted English words, chromosome names and plain
+    numbers removed.
+    """
+    return [
+        (t.upper(), t)
+        for t in GENE_PATTERN.findall(user_question)
+        if t.upper() not in BLACKLIST and not NOT_A_GENE_PATTERN.match(t.upper())
+    ]
 
-    # Find all candidates
-    candidates = re.findall(gene_pattern, text_upper)
 
-    # Choose the first candidate NOT in blacklist
-    for token in candidates:
-        if token not in BLACKLIST:
-            return token  # e.g., BRCA1
+def extract_gene_candidates(user_question: str) -> list[str]:
+    """All gene-like tokens in the question (uppercased), in order."""
+    return [token for token, _ in extract_gene_tokens(user_question)]
 
-    return None
+
+def looks_like_symbol(written: str) -> bool:
+    """
+    Whether a token was written like a gene symbol: with a digit (brca1,
+    TP53) or in capitals (CFTR). "heart" or "Can" read as English words.
+    """
+    return any(c.isdigit() for c in written) or written.isupper()
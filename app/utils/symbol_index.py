@@ -0,0 +1,532 @@
+# app/utils/symbol_index.py
+#
+# Spelling correction for gene symbols ("BRAC1" -> "BRCA1").
+#
+# Uses a symmetric-delete index (same idea as SymSpell): every known symbol
+# and alias is stored under all of its "delete variants" (the strings you get
+# by removing up to MAX_EDIT_DISTANCE characters). At lookup time we generate
+# the delete variants of the typo and only compare against symbols that share
+# one of them. No network call, and a lookup is a handful of dict hits.
+#
+# Tokens are only rewritten when the index holds every approved symbol
+# (GENE_SYMBOLS_PATH): against a partial list, TP63 is not a typo of TP53 but
+# a real gene the list doesn't know.
+
+import os
+import random
+import time
+
+MAX_EDIT_DISTANCE = 2
+
+# Short tokens only get one edit: at distance 2 "MSH" is close to half the list
+SHORT_TOKEN_LENGTH = 4
+
+# 3-letter tokens are only fuzzy-matched against approved symbols: short
+# aliases turn ordinary words into genes ("CAN" is one swap from ACN -> NF2)
+ALIAS_FUZZY_MIN_LENGTH = 4
+
+# Built-in approved symbol -> aliases list for v1.
+# Mostly clinically actionable genes (ACMG secondary findings list) plus a few
+# very common research genes. Too partial to correct against (see above): it
+# only recognises these symbols as written. For spelling correction, point
+# GENE_SYMBOLS_PATH at the HGNC "complete set" TSV (see load_hgnc_symbols).
+DEFAULT_GENE_SYMBOLS = {
+    "ACTA2": ["AAT6"],
+    "ACTC1": ["ACTC"],
+    "APC": ["DP2", "GS", "FPC"],
+    "APOB": ["FLDB", "LDLCQ4"],
+    "ATM": ["ATA", "ATDC"],
+    "ATP7B": ["WND", "PWD"],
+    "BAP1": ["UCHL2", "HUCEP-13"],
+    "BMPR1A": ["ALK3", "ACVRLK3"],
+    "BRAF": ["BRAF1", "RAFB1"],
+    "BRCA1": ["BRCAI", "BRCC1", "FANCS", "RNF53"],
+    "BRCA2": ["BRCC2", "FANCD1", "FAD1"],
+    "CACNA1S": ["CACNL1A3", "HOKPP1"],
+    "CDH1": ["CDHE", "UVO"],
+    "CDK4": ["CMM3", "PSK-J3"],
+    "CDKN2A": ["P16", "INK4A", "MTS1", "CDKN2"],
+    "CFTR": ["ABCC7", "CF", "MRP7"],
+    "CHEK2": ["CHK2", "RAD53", "CDS1"],
+    "COL3A1": ["EDS4A"],
+    "DSC2": ["ARVD11"],
+    "DSG2": ["ARVD10", "CDHF5"],
+    "DSP": ["DPI", "DPII"],
+    "EGFR": ["ERBB", "ERBB1", "HER1"],
+    "EPCAM": ["TACSTD1", "TROP1", "ESA"],
+    "ERBB2": ["HER2", "NEU", "CD340"],
+    "FBN1": ["MFS1", "WMS"],
+    "FLCN": ["BHD"],
+    "FMR1": ["FMRP", "FRAXA"],
+    "GLA": ["GALA"],
+    "HBB": ["CD113T-C", "BETA-GLOBIN"],
+    "HFE": ["HFE1", "HH", "HLA-H"],
+    "HNF1A": ["MODY3", "TCF1"],
+    "HTT": ["HD", "IT15"],
+    "KCNH2": ["HERG", "LQT2"],
+    "KCNQ1": ["KVLQT1", "LQT1"],
+    "KRAS": ["KRAS2", "RASK2"],
+    "LDLR": ["FHC", "LDLCQ2"],
+    "LMNA": ["LMN1", "CMD1A", "PRO1"],
+    "MEN1": ["MEAI", "SCG2"],
+    "MLH1": ["COCA2", "HNPCC", "HNPCC2"],
+    "MSH2": ["COCA1", "HNPCC1"],
+    "MSH6": ["GTBP", "HNPCC5"],
+    "MTOR": ["FRAP", "FRAP1", "RAFT1"],
+    "MUTYH": ["MYH"],
+    "MYBPC3": ["CMH4", "FHC"],
+    "MYC": ["BHLHE39", "C-MYC"],
+    "MYH11": ["AAT4", "SMMHC"],
+    "MYH7": ["CMD1S", "MPD1", "SPMD"],
+    "MYL2": ["CMH10", "MLC2"],
+    "MYL3": ["CMH8", "MLC1V"],
+    "NF1": ["NFNS", "WSS"],
+    "NF2": ["ACN", "SCH", "BANF"],
+    "NRAS": ["N-RAS", "NRAS1"],
+    "OTC": ["OCTD"],
+    "PALB2": ["FANCN"],
+    "PCSK9": ["FH3", "NARC1", "HCHOLA3"],
+    "PIK3CA": ["PI3K", "CWS5"],
+    "PKP2": ["ARVD9"],
+    "PMS2": ["PMSL2", "HNPCC4"],
+    "PRKAG2": ["AAKG2", "WPWS"],
+    "PTEN": ["MMAC1", "TEP1", "PTEN1"],
+    "RAD51C": ["FANCO", "RAD51L2"],
+    "RAD51D": ["RAD51L3", "TRAD"],
+    "RB1": ["OSRC", "PPP1R130"],
+    "RET": ["CDHF12", "PTC", "HSCR1"],
+    "RYR1": ["MHS", "CCO", "MHS1"],
+    "RYR2": ["ARVD2", "VTSIP"],
+    "SCN5A": ["LQT3", "HB1", "IVF"],
+    "SDHAF2": ["PGL2", "SDH5"],
+    "SDHB": ["SDH1", "PGL4"],
+    "SDHC": ["PGL3", "CYBL"],
+    "SDHD": ["PGL1", "CBT1"],
+    "SMAD3": ["LDS3", "MADH3"],
+    "SMAD4": ["DPC4", "MADH4", "JIP"],
+    "STK11": ["LKB1", "PJS"],
+    "TGFBR1": ["ALK5", "LDS1"],
+    "TGFBR2": ["MFS2", "LDS2", "TBR-II"],
+    "TMEM43": ["LUMA", "ARVD5"],
+    "TNNI3": ["CMH7", "TNNC1"],
+    "TNNT2": ["CMH2", "CMD1D"],
+    "TP53": ["P53", "LFS1", "TRP53"],
+    "TPM1": ["CMH3", "TMSA"],
+    "TSC1": ["TSC", "LAM"],
+    "TSC2": ["TSC4", "PKDTS"],
+    "VHL": ["VHL1", "RCA1"],
+    "WT1": ["GUD", "WAGR", "WIT-2"],
+}
+
+
+class SymbolIndex:
+    """
+    Symmetric-delete index over approved gene symbols + aliases.
+
+    symbols: { "BRCA1": ["BRCAI", "BRCC1", ...], ... }
+    complete: True when symbols is the full approved set (HGNC). Only then
+              does correct() map aliases and near-misses to a symbol.
+    """
+
+    def __init__(
+        self, symbols: dict, max_distance: int = MAX_EDIT_DISTANCE, complete: bool = False
+    ):
+        self.max_distance = max_distance
+        self.complete = complete
+
+        # term (symbol or alias, uppercase) -> approved symbols
+        terms: dict[str, set[str]] = {}
+        for symbol, aliases in symbols.items():
+            symbol = symbol.upper()
+            terms.setdefault(symbol, set()).add(symbol)
+            for alias in aliases or []:
+                terms.setdefault(alias.upper(), set()).add(symbol)
+        self.terms: dict[str, tuple[str, ...]] = {
+            term: tuple(sorted(owners)) for term, owners in terms.items()
+        }
+
+        # delete variant -> term, or tuple of terms (shortest first) when
+        # several share it. With the HGNC set this holds ~1.5M keys: a bare
+        # str/tuple instead of a set per key is what keeps it to ~300 MB.
+        deletes: dict[str, str | list[str]] = {}
+        for term in self.terms:
+            for variant in _delete_variants(term, max_distance, _min_variant_length):
+                hit = deletes.get(variant)
+                if hit is None:
+                    deletes[variant] = term
+                elif isinstance(hit, str):
+                    deletes[variant] = [hit, term]
+                else:
+                    hit.append(term)
+        self.deletes: dict[str, str | tuple[str, ...]] = {
+            variant: hit if isinstance(hit, str) else tuple(sorted(hit, key=len))
+            for variant, hit in deletes.items()
+        }
+
+        # Approved symbols win over aliases when distances tie
+        self.approved = frozenset(s.upper() for s in symbols)
+
+    def is_known(self, token: str) -> bool:
+        return token.upper() in (self.terms if self.complete else self.approved)
+
+    def lookup(self, token: str, max_distance: int | None = None) -> list[dict]:
+        """
+        Return candidate genes for token, best first:
+        [{"symbol": "BRCA1", "matched": "BRCA1", "distance": 1}, ...]
+
+        Only one entry per approved symbol (its closest matching term).
+        Tokens need at least 3 characters, and 5 for distance 2 (the
+        shortest that correct() looks up; see _min_variant_length).
+        """
+        if max_distance is None:
+            max_distance = self.max_distance
+        max_distance = min(max_distance, self.max_distance)
+
+        token = token.upper()
+
+        candidate_terms: set[str] = set()
+        for variant in _delete_variants(token, max_distance):
+            hit = self.deletes.get(variant)
+            if hit is None:
+                continue
+            if isinstance(hit, str):
+                candidate_terms.add(hit)
+                continue
+            # A term more than max_distance longer than the variant needed
+            # more deletes to get there than we allow
+            limit = len(variant) + max_distance
+            for term in hit:
+                if len(term) > limit:
+                    break
+                candidate_terms.add(term)
+
+        best: dict[str, dict] = {}
+        for term in candidate_terms:
+            if abs(len(term) - len(token)) > max_distance:
+                continue
+            distance = _osa_distance(token, term, max_distance)
+            if distance > max_distance:
+                continue
+            for symbol in self.terms[term]:
+                current = best.get(symbol)
+                if current is None or _rank(distance, term, symbol) < _rank(
+                    current["distance"], current["matched"], symbol
+                ):
+                    best[symbol] = {
+                        "symbol": symbol,
+                        "matched": term,
+                        "distance": distance,
+                    }
+
+        return sorted(
+            best.values(),
+            key=lambda c: (*_rank(c["distance"], c["matched"], c["symbol"]), c["symbol"]),
+        )
+
+    def correct(self, token: str) -> dict:
+        """
+        Decide what to do with a (possibly misspelled) symbol.
+
+        Returns:
+        {
+            "input": "BRAC1",
+            "symbol": "BRCA1" or None,     # None when ambiguous
+            "corrected": True/False,
+            "distance": 1 or None,
+            "ambiguous": True/False,
+            "candidates": ["BRCA1", ...],  # best-distance genes only
+        }
+
+        A token with no candidate at all is kept as-is: it may be a real gene
+        that is simply not in the index. On an incomplete index only exact
+        approved symbols are recognised and every other token is kept as-is
+        (an alias there may be another gene's approved symbol: TEP1).
+        """
+        token_up = token.upper()
+
+        result = {
+            "input": token,
+            "symbol": token_up,
+            "corrected": False,
+            "distance": None,
+            "ambiguous": False,
+            "candidates": [],
+        }
+
+        if not self.complete:
+            if token_up in self.approved:
+                result["distance"] = 0
+                result["candidates"] = [token_up]
+            return result
+
+        if token_up in self.terms:
+            symbols = list(self.terms[token_up])
+            result["distance"] = 0
+            result["candidates"] = symbols
+            if token_up in self.approved:
+                return result
+            # Alias -> approved symbol (flag if the alias is shared)
+            if len(symbols) == 1:
+                result["symbol"] = symbols[0]
+                result["corrected"] = symbols[0] != token_up
+            else:
+                result["symbol"] = None
+                result["ambiguous"] = True
+            return result
+
+        # Only the closest matches count, so try 1 edit before paying for 2
+        max_distance = 1 if len(token_up) <= SHORT_TOKEN_LENGTH else self.max_distance
+        matches = []
+        for distance in range(1, max_distance + 1):
+            matches = self.lookup(token_up, distance)
+            if len(token_up) < ALIAS_FUZZY_MIN_LENGTH:
+                matches = [m for m in matches if m["matched"] in self.approved]
+            if matches:
+                break
+        if not matches:
+            return result
+
+        best_distance = matches[0]["distance"]
+        best = [m["symbol"] for m in matches if m["distance"] == best_distance]
+
+        # Among equally close genes, an approved-symbol match beats alias matches
+        approved_hits = [
+            m["symbol"]
+            for m in matches
+            if m["distance"] == best_distance and m["matched"] in self.approved
+        ]
+        if len(approved_hits) == 1:
+            best = approved_hits
+
+        result["distance"] = best_distance
+        result["candidates"] = best
+
+        if len(best) == 1:
+            result["symbol"] = best[0]
+            result["corrected"] = True
+        else:
+            result["symbol"] = None
+            result["ambiguous"] = True
+
+        return result
+
+
+def _rank(distance: int, term: str, symbol: str) -> tuple[int, int]:
+    # Lower is better: edit distance first, then exact symbol over alias
+    return distance, 0 if term == symbol else 1
+
+
+def _min_variant_length(deleted: int) -> int:
+    """
+    Shortest variant worth indexing after `deleted` deletes. Looked-up tokens
+    have 3+ characters (GENE_PATTERN), and 5+ for 2 edits (SHORT_TOKEN_LENGTH),
+    so their variants never get shorter than this. Skipping the rest drops
+    the huge 1-2 character buckets that made every lookup scan thousands
+    of terms.
+    """
+    if deleted == 0:
+        return 0
+    min_token_length = 3 if deleted == 1 else SHORT_TOKEN_LENGTH + 1
+    return min_token_length - deleted
+
+
+def _delete_variants(term: str, max_distance: int, min_length=None) -> set[str]:
+    """
+    All strings reachable from term by deleting up to max_distance chars.
+    min_length(deleted) drops variants shorter than it returns.
+    """
+    variants = {term}
+    frontier = {term}
+    for deleted in range(1, max_distance + 1):
+        next_frontier = set()
+        for word in frontier:
+            if len(word) <= 1:
+                continue
+            for i in range(len(word)):
+                next_frontier.add(word[:i] + word[i + 1:])
+        next_frontier -= variants
+        frontier = next_frontier
+        if min_length is not None:
+            next_frontier = {v for v in next_frontier if len(v) >= min_length(deleted)}
+        variants |= next_frontier
+    return variants
+
+
+def _osa_distance(a: str, b: str, max_distance: int) -> int:
+    """
+    Optimal string alignment distance (Levenshtein + adjacent transpositions),
+    so "BRAC1" -> "BRCA1" counts as 1 edit. Stops early once every cell in a
+    row exceeds max_distance.
+    """
+    if a == b:
+        return 0
+
+    prev_prev: list[int] | None = None
+    prev = list(range(len(b) + 1))
+
+    for i in range(1, len(a) + 1):
+        cur = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            cur[j] = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + cost)
+            if (
+                prev_prev is not None
+                and j > 1
+                and a[i - 1] == b[j - 2]
+                and a[i - 2] == b[j - 1]
+            ):
+                cur[j] = min(cur[j], prev_prev[j - 2] + 1)
+        if min(cur) > max_distance:
+            return max_distance + 1
+        prev_prev, prev = prev, cur
+
+    return prev[-1]
+
+
+def load_hgnc_symbols(path: str) -> dict:
+    """
+    Read the HGNC complete set TSV (hgnc_complete_set.txt) into
+    { symbol: [aliases + previous symbols] }.
+    Withdrawn entries are skipped.
+    """
+    symbols: dict[str, list[str]] = {}
+
+    with open(path, encoding="utf-8") as f:
+        header = f.readline().rstrip("\n").split("\t")
+        col = {name: i for i, name in enumerate(header)}
+
+        for line in f:
+            fields = line.rstrip("\n").split("\t")
+            if "status" in col and fields[col["status"]] != "Approved":
+                continue
+            symbol = fields[col["symbol"]]
+            aliases = []
+            for name in ("alias_symbol", "prev_symbol"):
+                if name in col and col[name] < len(fields):
+                    value = fields[col[name]].strip('"')
+                    aliases.extend(a for a in value.split("|") if a)
+            symbols[symbol] = aliases
+
+    return symbols
+
+
+_INDEX: SymbolIndex | None = None
+
+
+def get_symbol_index() -> SymbolIndex:
+    """
+    Shared index, built on first use.
+    Uses GENE_SYMBOLS_PATH (HGNC TSV) if set, otherwise the built-in list
+    (which corrects nothing, see SymbolIndex).
+    """
+    global _INDEX
+    if _INDEX is None:
+        path = os.environ.get("GENE_SYMBOLS_PATH")
+        if path:
+            _INDEX = SymbolIndex(load_hgnc_symbols(path), complete=True)
+        else:
+            _INDEX = SymbolIndex(DEFAULT_GENE_SYMBOLS)
+    return _INDEX
+
+
+def correct_gene_symbol(token: str) -> dict:
+    """Shortcut for get_symbol_index().correct(token)."""
+    return get_symbol_index().correct(token)
+
+
+def _make_typo(symbol: str, rng: random.Random) -> str:
+    """One random edit: delete, insert, substitute or swap neighbours."""
+    alphabet = "ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789"
+    i = rng.randrange(len(symbol))
+    kind = rng.choice(["delete", "insert", "substitute", "transpose"])
+
+    if kind == "delete" and len(symbol) > 2:
+        return symbol[:i] + symbol[i + 1:]
+    if kind == "insert":
+        return symbol[:i] + rng.choice(alphabet) + symbol[i:]
+    if kind == "transpose" and i < len(symbol) - 1 and symbol[i] != symbol[i + 1]:
+        return symbol[:i] + symbol[i + 1] + symbol[i] + symbol[i + 2:]
+    return symbol[:i] + rng.choice(alphabet.replace(symbol[i], "")) + symbol[i + 1:]
+
+
+# Real genes that are NOT in DEFAULT_GENE_SYMBOLS, most of them one or two
+# edits from one that is. They must come back unchanged, never "corrected".
+OUT_OF_LIST_GENES = [
+    "TP63", "TP73", "MLH3", "MSH3", "ATR", "APOE", "APP", "GBA", "SMN1", "SMN2",
+    "ABCA4", "MYH9", "MYH6", "HRAS", "SMAD2", "FANCA", "FANCC", "DMD", "PMS1",
+    "BRIP1", "RAD50", "NBN", "CDK6", "CDH2", "TSC22D1", "NF1B", "PTPN11", "SOS1",
+    "RAF1", "MAP2K1", "GATA4", "NKX2-5", "TBX5", "LMNB1", "COL1A1", "COL4A5",
+    "PKD1", "PKD2", "HBA1", "F8", "F9", "VWF", "G6PD", "SERPINA1", "HEXA",
+]
+
+
+# Benchmark: latency + accuracy on a generated typo corpus
+if __name__ == "__main__":
+    rng = random.Random(0)
+
+    start = time.perf_counter()
+    index = get_symbol_index()
+    build_ms = (time.perf_counter() - start) * 1000
+    print(f"Index: {len(index.terms)} terms, {len(index.deletes)} delete keys, "
+          f"built in {build_ms:.1f} ms, complete={index.complete}")
+
+    # Out-of-list genes are real: whatever the index, they stay as written
+    changed = [g for g in OUT_OF_LIST_GENES if index.correct(g)["symbol"] != g]
+    print(f"{len(OUT_OF_LIST_GENES) - len(changed)}/{len(OUT_OF_LIST_GENES)} "
+          f"out-of-list genes passed through unchanged {changed or ''}")
+
+    if not index.complete:
+        # The built-in list corrects nothing; measure correction on a
+        # stand-in "complete" set (built-in list + the out-of-list genes)
+        print("Built-in list: typo benchmark uses a stand-in complete set "
+              "(set GENE_SYMBOLS_PATH for the real one)")
+        stand_in = dict(DEFAULT_GENE_SYMBOLS)
+        stand_in.update({g: [] for g in OUT_OF_LIST_GENES})
+        index = SymbolIndex(stand_in, complete=True)
+
+    for example in ["BRAC1", "TP35", "CTFR", "BRCA1", "MSH", "TP63"]:
+        print(example, "->", index.correct(example))
+
+    symbols = sorted(index.approved)
+    corpus = []
+    for edits in (1, 2):
+        for _ in range(10000):
+            symbol = rng.choice(symbols)
+            typo = symbol
+            for _ in range(edits):
+                typo = _make_typo(typo, rng)
+            distance = _osa_distance(typo, symbol, edits)
+            # Shorter tokens never reach the index (GENE_PATTERN)
+            if distance == edits and len(typo) >= 3 and typo not in index.terms:
+                corpus.append((symbol, typo, distance))
+
+    timings = []
+    results = {1: [0, 0, 0, 0], 2: [0, 0, 0, 0]}  # correct, ambiguous, kept, wrong
+    for truth, typo, distance in corpus:
+        t0 = time.perf_counter()
+        result = index.correct(typo)
+        timings.append(time.perf_counter() - t0)
+
+        counts = results[distance]
+        if result["ambiguous"]:
+            counts[1] += 1
+        elif result["symbol"] == truth:
+            counts[0] += 1
+        elif result["symbol"] == typo:
+            counts[2] += 1
+        else:
+            counts[3] += 1
+
+    for distance, (correct, ambiguous, kept, wrong) in results.items():
+        n = correct + ambiguous + kept + wrong
+        print(f"\n{n} typos ({distance} edit{'s' if distance > 1 else ''} each)")
+        print(f"  correct:   {correct / n:.1%}")
+        print(f"  ambiguous: {ambiguous / n:.1%}  (flagged, not guessed)")
+        print(f"  kept:      {kept / n:.1%}  (too far, or short symbol: 1 edit max)")
+        print(f"  wrong:     {wrong / n:.1%}")
+
+    timings.sort()
+    n = len(timings)
+    print()
+    for p in (50, 90, 99):
+        print(f"p{p} latency: {timings[int(n * p / 100) - 1] * 1e6:.1f} us")
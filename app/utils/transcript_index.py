@@ -0,0 +1,613 @@
+# app/utils/transcript_index.py
+#
+# Transcript coordinate layer: c. positions <-> genomic positions, and
+# genomic position -> overlapping genes.
+#
+# Source annotation: a RefSeq / MANE transcript table in UCSC genePred(Ext)
+# format (e.g. ncbiRefSeq.txt or the MANE Select genePred). It is compiled
+# once into a compact binary file:
+#
+#   python utils/transcript_index.py build mane.genePred mane.idx
+#   export GENEGPT_TRANSCRIPT_INDEX=mane.idx
+#
+# The binary is memory-mapped on load (no parsing, pages shared between
+# pre-fork workers). Overlap queries use an implicit augmented interval tree
+# over transcripts sorted by start (the cgranges layout), so a lookup is
+# O(log n + hits).
+#
+# Genomic positions in the public API are 1-based (HGVS / VCF style).
+# Inside the index everything is 0-based, half-open (genePred style).
+
+import json
+import mmap
+import os
+import random
+import struct
+import sys
+import time
+from array import array
+
+MAGIC = b"GGTXIDX1"
+
+# int64 arrays stored after the JSON header, in this order
+_TX_ARRAYS = ["chrom_idx", "tx_start", "tx_end", "max_end", "cds_start", "cds_end", "strand"]
+_COMPLEMENT = str.maketrans("ACGTacgt", "TGCAtgca")
+
+
+def _revcomp(seq: str) -> str:
+    return seq.translate(_COMPLEMENT)[::-1]
+
+
+# ----- building -----
+
+def parse_genepred(path: str) -> list[dict]:
+    """
+    Read genePred / genePredExt lines (with or without the leading UCSC
+    "bin" column). The gene symbol comes from the name2 column.
+    """
+    transcripts = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip() or line.startswith("#"):
+                continue
+            fields = line.rstrip("\n").split("\t")
+            # With bin column: bin, name, chrom, strand, ... (16 columns)
+            if len(fields) >= 16 and fields[0].isdigit() and fields[3] in "+-":
+                fields = fields[1:]
+            if len(fields) < 12:
+                continue
+
+            transcripts.append(
+                {
+                    "name": fields[0],
+                    "chrom": fields[1],
+                    "strand": fields[2],
+                    "tx_start": int(fields[3]),
+                    "tx_end": int(fields[4]),
+                    "cds_start": int(fields[5]),
+                    "cds_end": int(fields[6]),
+                    "exon_starts": [int(x) for x in fields[8].rstrip(",").split(",")],
+                    "exon_ends": [int(x) for x in fields[9].rstrip(",").split(",")],
+                    "gene": fields[11],
+                }
+            )
+    return transcripts
+
+
+def _index_max_end(starts, ends, max_end, lo: int, n: int) -> int:
+    """
+    Fill max_end[lo:lo + n] for the implicit interval tree (cgranges):
+    node i at level k covers the subtree below it and stores the largest
+    end in it. Returns the tree height.
+    """
+    if n == 0:
+        return -1
+
+    last_i = 0
+    last = 0
+    for i in range(0, n, 2):
+        last_i = i
+        last = max_end[lo + i] = ends[lo + i]
+
+    k = 1
+    while (1 << k) <= n:
+        x = 1 << (k - 1)
+        i0 = (x << 1) - 1
+        step = x << 2
+        for i in range(i0, n, step):
+            el = max_end[lo + i - x]
+            er = max_end[lo + i + x] if i + x < n else last
+            max_end[lo + i] = max(ends[lo + i], el, er)
+        last_i = last_i - x if (last_i >> k) & 1 else last_i + x
+        if last_i < n and max_end[lo + last_i] > last:
+            last = max_end[lo + last_i]
+        k += 1
+
+    return k - 1
+
+
+def build_index(transcripts: list[dict], out_path: str) -> None:
+    """Compile parsed transcripts into the binary index file."""
+    transcripts = sorted(transcripts, key=lambda t: (t["chrom"], t["tx_start"], t["tx_end"]))
+    n = len(transcripts)
+
+    chroms: list[str] = []
+    chrom_ranges: dict[str, list[int]] = {}
+    arrays = {name: array("q", [0]) * n for name in _TX_ARRAYS}
+    exon_offset = array("q", [0]) * (n + 1)
+    exon_starts = array("q")
+    exon_ends = array("q")
+
+    for i, t in enumerate(transcripts):
+        if not chroms or chroms[-1] != t["chrom"]:
+            chroms.append(t["chrom"])
+            chrom_ranges[t["chrom"]] = [i, i, 0]
+        chrom_ranges[t["chrom"]][1] = i + 1
+
+        arrays["chrom_idx"][i] = len(chroms) - 1
+        arrays["tx_start"][i] = t["tx_start"]
+        arrays["tx_end"][i] = t["tx_end"]
+        arrays["cds_start"][i] = t["cds_start"]
+        arrays["cds_end"][i] = t["cds_end"]
+        arrays["strand"][i] = 1 if t["strand"] == "+" else -1
+
+        exon_offset[i] = len(exon_starts)
+        exon_starts.extend(t["exon_starts"])
+        exon_ends.extend(t["exon_ends"])
+    exon_offset[n] = len(exon_starts)
+
+    for chrom, (lo, hi, _) in chrom_ranges.items():
+        chrom_ranges[chrom][2] = _index_max_end(
+            arrays["tx_start"], arrays["tx_end"], arrays["max_end"], lo, hi - lo
+        )
+
+    # First transcript seen per gene in the *input* order is its default
+    # (MANE Select when built from the MANE file).
+    order = {id(t): i for i, t in enumerate(transcripts)}
+    default_for_gene: dict[str, int] = {}
+    for t in sorted(transcripts, key=lambda t: t.get("_input_order", 0)):
+        default_for_gene.setdefault(t["gene"].upper(), order[id(t)])
+
+    header = json.dumps(
+        {
+            "n": n,
+            "n_exons": len(exon_starts),
+            "chroms": chroms,
+            "chrom_ranges": chrom_ranges,
+            "names": [t["name"] for t in transcripts],
+            "genes": [t["gene"] for t in transcripts],
+            "default_for_gene": default_for_gene,
+        }
+    ).encode()
+    header += b" " * (-len(header) % 8)  # keep the int64 arrays aligned
+
+    with open(out_path, "wb") as f:
+        f.write(MAGIC)
+        f.write(struct.pack("<Q", len(header)))
+        f.write(header)
+        for name in _TX_ARRAYS:
+            f.write(arrays[name].tobytes())
+        f.write(exon_offset.tobytes())
+        f.write(exon_starts.tobytes())
+        f.write(exon_ends.tobytes())
+
+
+def build_index_from_genepred(genepred_path: str, out_path: str) -> None:
+    transcripts = parse_genepred(genepred_path)
+    for i, t in enumerate(transcripts):
+        t["_input_order"] = i
+    build_index(transcripts, out_path)
+
+
+# ----- querying -----
+
+class TranscriptIndex:
+    """Memory-mapped transcript index (see build_index)."""
+
+    def __init__(self, path: str):
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if self._mm[:8] != MAGIC:
+            raise ValueError(f"{path} is not a GeneGPT transcript index")
+        (header_len,) = struct.unpack("<Q", self._mm[8:16])
+        header = json.loads(self._mm[16:16 + header_len])
+
+        self.n = header["n"]
+        self.chroms: list[str] = header["chroms"]
+        self.chrom_ranges: dict[str, list[int]] = header["chrom_ranges"]
+        self.names: list[str] = header["names"]
+        self.genes: list[str] = header["genes"]
+        self._default_for_gene: dict[str, int] = header["default_for_gene"]
+
+        self._by_name = {}
+        for i, name in enumerate(self.names):
+            self._by_name[name] = i
+            self._by_name.setdefault(name.split(".")[0], i)  # unversioned
+
+        # Zero-copy int64 views into the mapped file
+        words = memoryview(self._mm).cast("q")
+        pos = (16 + header_len) // 8
+        for name in _TX_ARRAYS:
+            setattr(self, name, words[pos:pos + self.n])
+            pos += self.n
+        self.exon_offset = words[pos:pos + self.n + 1]
+        pos += self.n + 1
+        n_exons = header["n_exons"]
+        self.exon_starts = words[pos:pos + n_exons]
+        pos += n_exons
+        self.exon_ends = words[pos:pos + n_exons]
+
+    # --- lookups by name ---
+
+    def transcript_id(self, name: str) -> int | None:
+        """Index of a transcript by accession, with or without version."""
+        i = self._by_name.get(name)
+        if i is None:
+            i = self._by_name.get(name.split(".")[0])
+        return i
+
+    def default_transcript(self, gene: str) -> int | None:
+        return self._default_for_gene.get(gene.upper()) if gene else None
+
+    # --- interval queries ---
+
+    def overlapping(self, chrom: str, start: int, end: int) -> list[int]:
+        """
+        Transcripts overlapping the 1-based inclusive range [start, end].
+        """
+        chrom = _normalize_chrom(chrom, self.chrom_ranges)
+        if chrom is None:
+            return []
+        lo, hi, height = self.chrom_ranges[chrom]
+        return self._overlap(lo, hi - lo, height, start - 1, end)
+
+    def _overlap(self, lo: int, n: int, height: int, st: int, en: int) -> list[int]:
+        # Walk the implicit tree over tx_start/tx_end/max_end[lo:lo + n].
+        tx_start, tx_end, max_end = self.tx_start, self.tx_end, self.max_end
+        hits: list[int] = []
+        if height < 0:
+            return hits
+
+        stack = [(height, (1 << height) - 1, 0)]
+        while stack:
+            k, x, w = stack.pop()
+            if k <= 3:
+                # Small subtree: linear scan
+                i0 = (x >> k) << k
+                i1 = min(i0 + (1 << (k + 1)) - 1, n)
+                i = i0
+                while i < i1 and tx_start[lo + i] < en:
+                    if st < tx_end[lo + i]:
+                        hits.append(lo + i)
+                    i += 1
+            elif w == 0:
+                # Left child first (only if something there can reach st)
+                y = x - (1 << (k - 1))
+                stack.append((k, x, 1))
+                if y >= n or max_end[lo + y] > st:
+                    stack.append((k - 1, y, 0))
+            elif x < n and tx_start[lo + x] < en:
+                if st < tx_end[lo + x]:
+                    hits.append(lo + x)
+                stack.append((k - 1, x + (1 << (k - 1)), 0))
+        return hits
+
+    def genes_at(self, chrom: str, pos: int) -> list[str]:
+        """Gene symbols whose transcripts cover 1-based position pos."""
+        return sorted({self.genes[i] for i in self.overlapping(chrom, pos, pos)})
+
+    # --- c. <-> genomic ---
+
+    def _exons_in_transcript_order(self, t: int) -> list[tuple[int, int]]:
+        a, b = self.exon_offset[t], self.exon_offset[t + 1]
+        exons = [(self.exon_starts[i], self.exon_ends[i]) for i in range(a, b)]
+        return exons if self.strand[t] == 1 else exons[::-1]
+
+    def _genomic_to_n(self, t: int, g: int) -> int | None:
+        """0-based genomic -> 1-based transcript (n.) position, exonic only."""
+        plus = self.strand[t] == 1
+        n_before = 0
+        for start, end in self._exons_in_transcript_order(t):
+            if start <= g < end:
+                return n_before + (g - start if plus else end - 1 - g) + 1
+            n_before += end - start
+        return None
+
+    def _n_to_genomic(self, t: int, n: int) -> int | None:
+        plus = self.strand[t] == 1
+        n_before = 0
+        for start, end in self._exons_in_transcript_order(t):
+            length = end - start
+            if n <= n_before + length:
+                offset = n - n_before - 1
+                return start + offset if plus else end - 1 - offset
+            n_before += length
+        return None
+
+    def _cds_bounds_n(self, t: int) -> tuple[int, int]:
+        if self.cds_start[t] >= self.cds_end[t]:
+            raise ValueError(f"{self.names[t]} is non-coding, no c. coordinates")
+        if self.strand[t] == 1:
+            first, last = self.cds_start[t], self.cds_end[t] - 1
+        else:
+            first, last = self.cds_end[t] - 1, self.cds_start[t]
+        return self._genomic_to_n(t, first), self._genomic_to_n(t, last)
+
+    def c_to_genomic(self, t: int, c_pos: str) -> int:
+        """
+        "68", "-20", "*5", "68+2", "69-1" on transcript t
+        -> 1-based genomic position.
+        """
+        prefix, number, offset = _parse_c_position(c_pos)
+        cds_first_n, cds_last_n = self._cds_bounds_n(t)
+
+        if prefix == "-":
+            n = cds_first_n - number
+        elif prefix == "*":
+            n = cds_last_n + number
+        else:
+            if number < 1:
+                raise ValueError(f"invalid c. position: {c_pos}")
+            n = cds_first_n + number - 1
+
+        g = self._n_to_genomic(t, n) if n >= 1 else None
+        if g is None:
+            raise ValueError(f"c.{c_pos} is outside {self.names[t]}")
+
+        g += offset if self.strand[t] == 1 else -offset
+        return g + 1
+
+    def genomic_to_c(self, t: int, pos: int) -> str:
+        """1-based genomic position -> c. position string on transcript t."""
+        g = pos - 1
+        if not (self.tx_start[t] <= g < self.tx_end[t]):
+            raise ValueError(f"{pos} is outside {self.names[t]}")
+
+        n = self._genomic_to_n(t, g)
+        if n is not None:
+            return self._n_to_c(t, n)
+
+        # Intronic: anchor on the nearest exon base, HGVS style (+/- offset)
+        plus = self.strand[t] == 1
+        exons = self._exons_in_transcript_order(t)
+        for (s1, e1), (s2, e2) in zip(exons, exons[1:]):
+            if plus and e1 <= g < s2:
+                before, after = g - (e1 - 1), s2 - g
+                up_base, down_base = e1 - 1, s2
+            elif not plus and e2 <= g < s1:
+                before, after = s1 - g, g - (e2 - 1)
+                up_base, down_base = s1, e2 - 1
+            else:
+                continue
+            if before <= after:
+                return f"{self._n_to_c(t, self._genomic_to_n(t, up_base))}+{before}"
+            return f"{self._n_to_c(t, self._genomic_to_n(t, down_base))}-{after}"
+
+        raise ValueError(f"{pos} could not be placed on {self.names[t]}")
+
+    def _n_to_c(self, t: int, n: int) -> str:
+        cds_first_n, cds_last_n = self._cds_bounds_n(t)
+        if n < cds_first_n:
+            return f"-{cds_first_n - n}"
+        if n > cds_last_n:
+            return f"*{n - cds_last_n}"
+        return str(n - cds_first_n + 1)
+
+    def chrom_of(self, t: int) -> str:
+        return self.chroms[self.chrom_idx[t]]
+
+
+def _normalize_chrom(chrom: str, known) -> str | None:
+    if chrom in known:
+        return chrom
+    alt = chrom[3:] if chrom.lower().startswith("chr") else f"chr{chrom}"
+    return alt if alt in known else None
+
+
+def _parse_c_position(c_pos: str) -> tuple[str, int, int]:
+    c_pos = c_pos.strip()
+    prefix = c_pos[0] if c_pos[:1] in ("-", "*") else ""
+    rest = c_pos[len(prefix):]
+
+    offset = 0
+    for sign in ("+", "-"):
+        if sign in rest:
+            rest, off = rest.split(sign, 1)
+            offset = int(off) if sign == "+" else -int(off)
+            break
+
+    return prefix, int(rest), offset
+
+
+# ----- canonical variant keys -----
+
+def canonicalize_variant(
+    index: TranscriptIndex,
+    gene: str | None,
+    positions: str,
+    change: str,
+    transcript: str | None = None,
+) -> dict | None:
+    """
+    Map a c. variant to a transcript-independent genomic key.
+
+    positions: "68_69", "5266", "-20", "68+2"
+    change:    "delAG", "A>G", "insT", "del", "delinsTT"
+
+    Returns
+    {
+        "transcript": "NM_007294.4",
+        "gene": "BRCA1",
+        "chrom": "chr17", "start": 43124027, "end": 43124028,
+        "canonical_key": "chr17:g.43124027_43124028del",
+    }
+    or None when the transcript/gene is not in the index.
+
+    Alleles are put on the genomic + strand. Deletions/insertions are not
+    shifted left (that needs the reference sequence), so the key is only
+    canonical for variants written at the same position.
+    """
+    t = index.transcript_id(transcript) if transcript else index.default_transcript(gene)
+    if t is None:
+        return None
+
+    try:
+        ends = [index.c_to_genomic(t, p) for p in positions.split("_")]
+    except ValueError:
+        return None
+
+    chrom = index.chrom_of(t)
+    plus = index.strand[t] == 1
+    start, end = min(ends), max(ends)
+    loc = f"{start}" if start == end else f"{start}_{end}"
+
+    if ">" in change:
+        ref, alt = change.upper().split(">", 1)
+        if not plus:
+            ref, alt = _revcomp(ref), _revcomp(alt)
+        key = f"{chrom}:g.{loc}{ref}>{alt}"
+    elif change.lower().startswith("ins"):
+        seq = change[3:].upper()
+        key = f"{chrom}:g.{loc}ins{seq if plus else _revcomp(seq)}"
+    elif change.lower().startswith("delins"):
+        seq = change[6:].upper()
+        key = f"{chrom}:g.{loc}delins{seq if plus else _revcomp(seq)}"
+    elif change.lower().startswith("del"):
+        # Deleted bases are implied by the position
+        key = f"{chrom}:g.{loc}del"
+    else:
+        key = f"{chrom}:g.{loc}{change}"
+
+    return {
+        "transcript": index.names[t],
+        "gene": index.genes[t],
+        "chrom": chrom,
+        "start": start,
+        "end": end,
+        "canonical_key": key,
+    }
+
+
+def genomic_position_key(chrom: str, pos: int) -> str:
+    """Key for a bare position, e.g. ("17", 43094464) -> "chr17:g.43094464"."""
+    if chrom.lower().startswith("chr"):
+        chrom = chrom[3:]
+    return f"chr{chrom.upper()}:g.{pos}"
+
+
+_INDEX: TranscriptIndex | None = None
+_INDEX_LOADED = False
+
+
+def get_transcript_index() -> TranscriptIndex | None:
+    """
+    Shared index from GENEGPT_TRANSCRIPT_INDEX (a file made by build_index).
+    None when not configured: variants are then left uncanonicalized.
+    """
+    global _INDEX, _INDEX_LOADED
+    if not _INDEX_LOADED:
+        _INDEX_LOADED = True
+        path = os.environ.get("GENEGPT_TRANSCRIPT_INDEX")
+        if path:
+            try:
+                _INDEX = TranscriptIndex(path)
+            except (OSError, ValueError) as e:
+                print(f"[TRANSCRIPTS] Could not load {path}: {e}")
+    return _INDEX
+
+
+# ----- CLI: build + benchmark -----
+
+def _synthetic_genepred(path: str, n_genes: int, rng: random.Random) -> None:
+    """Random but well-formed genePred file for benchmarking."""
+    chroms = [f"chr{c}" for c in list(range(1, 23)) + ["X", "Y"]]
+    with open(path, "w") as f:
+        for i in range(n_genes):
+            chrom = rng.choice(chroms)
+            tx_start = rng.randrange(0, 240_000_000)
+            exon_count = rng.randint(1, 20)
+            starts, ends = [], []
+            pos = tx_start
+            for _ in range(exon_count):
+                length = rng.randint(50, 400)
+                starts.append(pos)
+                ends.append(pos + length)
+                pos += length + rng.randint(200, 20_000)
+            tx_end = ends[-1]
+            cds_start = starts[0] + rng.randint(0, (ends[0] - starts[0]) // 2)
+            cds_end = ends[-1] - rng.randint(0, (ends[-1] - starts[-1]) // 2)
+            strand = rng.choice("+-")
+            f.write(
+                "\t".join(
+                    [
+                        f"NM_{i:06d}.1", chrom, strand, str(tx_start), str(tx_end),
+                        str(cds_start), str(cds_end), str(exon_count),
+                        ",".join(map(str, starts)) + ",",
+                        ",".join(map(str, ends)) + ",",
+                        "0", f"GENE{i}", "cmpl", "cmpl", "",
+                    ]
+                )
+                + "\n"
+            )
+
+
+def _benchmark(index_path: str, queries: int, rng: random.Random) -> None:
+    start = time.perf_counter()
+    index = TranscriptIndex(index_path)
+    print(f"Loaded {index.n:,} transcripts in {(time.perf_counter() - start) * 1000:.1f} ms "
+          f"({os.path.getsize(index_path) / 1e6:.1f} MB file)")
+
+    # Random positions within each chromosome's annotated span
+    spans = {
+        chrom: (index.tx_start[lo] + 1, max(index.tx_end[lo:hi].tolist()))
+        for chrom, (lo, hi, _) in index.chrom_ranges.items()
+    }
+    chroms = list(spans)
+    positions = []
+    for _ in range(queries):
+        chrom = rng.choice(chroms)
+        positions.append((chrom, rng.randint(*spans[chrom])))
+
+    start = time.perf_counter()
+    hits = 0
+    for chrom, pos in positions:
+        hits += len(index.overlapping(chrom, pos, pos))
+    elapsed = time.perf_counter() - start
+    print(f"{queries:,} position queries: {elapsed:.2f}s "
+          f"({elapsed / queries * 1e6:.2f} us/query, {hits:,} hits)")
+
+    # Check against a linear scan on a sample
+    for chrom, pos in positions[:2000]:
+        lo, hi, _ = index.chrom_ranges[chrom]
+        expected = [i for i in range(lo, hi) if index.tx_start[i] < pos <= index.tx_end[i]]
+        assert sorted(index.overlapping(chrom, pos, pos)) == expected, (chrom, pos)
+
+    # c. -> genomic -> c. round trips on random coding positions
+    round_trips = 0
+    start = time.perf_counter()
+    for _ in range(20000):
+        t = rng.randrange(index.n)
+        if index.cds_start[t] >= index.cds_end[t]:
+            continue
+        first_n, last_n = index._cds_bounds_n(t)
+        c = str(rng.randint(1, last_n - first_n + 1))
+        assert index.genomic_to_c(t, index.c_to_genomic(t, c)) == c
+        round_trips += 1
+    elapsed = time.perf_counter() - start
+    print(f"{round_trips:,} c.->g.->c. round trips OK "
+          f"({elapsed / max(round_trips, 1) * 1e6:.1f} us each)")
+
+
+if __name__ == "__main__":
+    usage = (
+        "usage:\n"
+        "  python transcript_index.py build <annotation.genePred> <out.idx>\n"
+        "  python transcript_index.py bench [index.idx] [queries]"
+    )
+    if len(sys.argv) < 2 or sys.argv[1] not in ("build", "bench"):
+        print(usage)
+        sys.exit(1)
+
+    rng = random.Random(0)
+
+    if sys.argv[1] == "build":
+        if len(sys.argv) != 4:
+            print(usage)
+            sys.exit(1)
+        start = time.perf_counter()
+        build_index_from_genepred(sys.argv[2], sys.argv[3])
+        print(f"Built {sys.argv[3]} in {time.perf_counter() - start:.1f}s")
+    else:
+        queries = int(sys.argv[3]) if len(sys.argv) > 3 else 1_000_000
+        if len(sys.argv) > 2:
+            _benchmark(sys.argv[2], queries, rng)
+        else:
+            import tempfile
+
+            with tempfile.TemporaryDirectory() as tmp:
+                genepred = os.path.join(tmp, "synthetic.genePred")
+                index_path = os.path.join(tmp, "synthetic.idx")
+                _synthetic_genepred(genepred, 20000, rng)
+                build_index_from_genepred(genepred, index_path)
+                _benchmark(index_path, queries, rng)
@@ -0,0 +1,469 @@
+# app/worker_pool.py
+#
+# Pre-fork worker mode for the pipeline.
+#
+# The master process loads the read-only data once (gene symbol index,
+# OMIM gene map, ...), freezes it out of the garbage collector and then
+# forks the workers. Workers inherit that memory copy-on-write, so nothing is
+# re-parsed and the pages stay shared. Each request goes to the worker with
+# the fewest requests in flight. A worker exits after max_requests requests
+# or once its private memory (not shared with the master) passes
+# max_private_mb, and the master forks a fresh one.
+#
+# Linux/macOS only (needs fork).
+
+import gc
+import itertools
+import multiprocessing as mp
+import os
+import queue
+import sys
+import threading
+import time
+from concurrent.futures import Future
+
+DEFAULT_MAX_REQUESTS = 1000
+DEFAULT_MAX_PRIVATE_MB = 512
+
+# How often the master checks for workers that died without an "exit"
+REAP_INTERVAL_S = 0.5
+
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+def current_rss_bytes() -> int:
+    """Resident set size of this process (current, not peak)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except OSError:
+        import resource
+        # Peak RSS; kilobytes on Linux, bytes on macOS
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if os.uname().sysname == "Darwin" else peak * 1024
+
+
+def private_rss_bytes(pid: int) -> int | None:
+    """
+    Memory only this process holds (not shared copy-on-write with the
+    master), from /proc/<pid>/smaps_rollup. None where unavailable.
+    """
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            return sum(
+                int(line.split()[1]) * 1024
+                for line in f
+                if line.startswith(("Private_Clean:", "Private_Dirty:"))
+            )
+    except OSError:
+        return None
+
+
+def worker_memory_bytes() -> int:
+    """
+    What a worker's recycling limit is measured against: its private memory.
+    RSS also counts the pages shared with the master, so a large preload
+    would push every worker over the limit. Falls back to RSS without /proc.
+    """
+    private = private_rss_bytes(os.getpid())
+    return private if private is not None else current_rss_bytes()
+
+
+def preload_shared_data() -> None:
+    """
+    Build everything the workers should share before forking.
+    Anything that is lazily built on first use belongs here, and so do the
+    heavy imports (openai, pyarrow, requests): imported after the fork they
+    cost every worker its own copy, again on every recycle.
+    """
+    from utils.symbol_index import get_symbol_index
+    from utils.transcript_index import get_transcript_index
+    import omim_client  # noqa: F401  (GENE_TO_MIM)
+    import clinvar_client  # noqa: F401
+    import llm_explainer  # noqa: F401
+    import answer_archive  # noqa: F401
+    import pipeline  # noqa: F401
+
+    get_symbol_index()
+    get_transcript_index()  # mmap'd, so workers share the same pages
+
+
+def _default_handler(user_question: str):
+    from pipeline import run_genegpt_pipeline
+    return run_genegpt_pipeline(user_question)
+
+
+def _reset_archive_after_fork() -> None:
+    # An archive inherited from the master has no writer thread here and
+    # shares its open file: start a fresh one in this worker on first use.
+    answer_archive = sys.modules.get("answer_archive")
+    if answer_archive is not None:
+        answer_archive._ARCHIVE = None
+
+
+def _close_archive() -> None:
+    # Workers leave through os._exit(), which skips atexit: flush the
+    # archive's queued rows and close its Parquet file by hand.
+    answer_archive = sys.modules.get("answer_archive")
+    if answer_archive is not None and answer_archive._ARCHIVE is not None:
+        answer_archive._ARCHIVE.close()
+
+
+def _worker_loop(worker_id, handler, task_q, result_q, max_requests, max_private_bytes):
+    _reset_archive_after_fork()
+    handled = 0
+    reason = "shutdown"
+    while True:
+        task = task_q.get()
+        if task is None:
+            break
+
+        task_id, args = task
+        try:
+            result_q.put(("result", worker_id, task_id, True, handler(*args), current_rss_bytes()))
+        except Exception as e:
+            result_q.put(("result", worker_id, task_id, False, repr(e), current_rss_bytes()))
+
+        handled += 1
+        if handled >= max_requests:
+            reason = "max_requests"
+            break
+        if worker_memory_bytes() > max_private_bytes:
+            reason = "max_private"
+            break
+
+    _close_archive()
+    result_q.put(("exit", worker_id, reason, current_rss_bytes()))
+
+
+class _Worker:
+    def __init__(self, worker_id: int, process, task_q):
+        self.worker_id = worker_id
+        self.process = process
+        self.task_q = task_q
+        self.inflight: dict[int, tuple[Future, tuple]] = {}
+        self.handled = 0
+        self.rss_bytes = 0
+
+
+class PreforkPool:
+    """
+    pool = PreforkPool(workers=4)
+    pool.start()
+    answer_json, text = pool.submit("BRCA1 c.68_69delAG?").result()
+    pool.close()
+
+    handler(*args) runs in the workers; its return value must be picklable.
+    """
+
+    def __init__(
+        self,
+        workers: int | None = None,
+        handler=_default_handler,
+        max_requests: int = DEFAULT_MAX_REQUESTS,
+        max_private_mb: int = DEFAULT_MAX_PRIVATE_MB,
+        preload=preload_shared_data,
+    ):
+        self.num_workers = workers or os.cpu_count() or 1
+        self.handler = handler
+        self.max_requests = max_requests
+        self.max_private_bytes = max_private_mb * 1024 * 1024
+        self.preload = preload
+
+        self.recycled = 0
+        self.worker_stats: list[dict] = []  # one entry per retired worker
+
+        self._ctx = mp.get_context("fork")
+        self._result_q = self._ctx.Queue()
+        self._workers: dict[int, _Worker] = {}
+        self._worker_ids = itertools.count()
+        self._task_ids = itertools.count()
+        self._lock = threading.Lock()
+        self._closing = False
+        self._collector: threading.Thread | None = None
+
+    def start(self) -> "PreforkPool":
+        if self.preload is not None:
+            self.preload()
+        # Keep preloaded objects out of GC passes: the collector touching
+        # their headers would un-share the copy-on-write pages.
+        gc.freeze()
+
+        with self._lock:
+            for _ in range(self.num_workers):
+                self._spawn()
+
+        self._collector = threading.Thread(
+            target=self._collect, name="prefork-collector", daemon=True
+        )
+        self._collector.start()
+        return self
+
+    def submit(self, *args) -> Future:
+        future: Future = Future()
+        with self._lock:
+            if self._closing:
+                raise RuntimeError("PreforkPool is closed")
+            task_id = next(self._task_ids)
+            worker = min(self._workers.values(), key=lambda w: len(w.inflight))
+            worker.inflight[task_id] = (future, args)
+            worker.task_q.put((task_id, args))
+        return future
+
+    def map(self, items) -> list:
+        futures = [self.submit(item) for item in items]
+        return [f.result() for f in futures]
+
+    def stats(self) -> list[dict]:
+        """Per-worker pid, requests handled and last reported RSS."""
+        with self._lock:
+            return [
+                {
+                    "worker_id": w.worker_id,
+                    "pid": w.process.pid,
+                    "handled": w.handled,
+                    "rss_mb": w.rss_bytes / (1024 * 1024),
+                }
+                for w in self._workers.values()
+            ]
+
+    def close(self, timeout: float = 10.0) -> None:
+        with self._lock:
+            self._closing = True
+            workers = list(self._workers.values())
+        for w in workers:
+            w.task_q.put(None)
+        for w in workers:
+            w.process.join(timeout)
+            if w.process.is_alive():
+                w.process.terminate()
+        if self._collector is not None:
+            self._collector.join(timeout)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # ----- master side -----
+
+    def _spawn(self) -> None:
+        # Caller holds self._lock
+        worker_id = next(self._worker_ids)
+        # Queue (not SimpleQueue): put() hands off to a feeder thread, so
+        # submit() never blocks on a full pipe while holding the lock.
+        task_q = self._ctx.Queue()
+        process = self._ctx.Process(
+            target=_worker_loop,
+            args=(
+                worker_id,
+                self.handler,
+                task_q,
+                self._result_q,
+                self.max_requests,
+                self.max_private_bytes,
+            ),
+            name=f"genegpt-worker-{worker_id}",
+            daemon=True,
+        )
+        process.start()
+        self._workers[worker_id] = _Worker(worker_id, process, task_q)
+
+    def _collect(self) -> None:
+        next_reap = time.monotonic() + REAP_INTERVAL_S
+        while True:
+            # Reap on a timer, not only when idle: under steady load the
+            # queue is never empty and a killed worker would keep getting work.
+            if time.monotonic() >= next_reap:
+                self._reap_dead_workers()
+                next_reap = time.monotonic() + REAP_INTERVAL_S
+
+            try:
+                message = self._result_q.get(timeout=REAP_INTERVAL_S)
+            except queue.Empty:
+                with self._lock:
+                    if self._closing and not self._workers:
+                        return
+                continue
+
+            if message[0] == "result":
+                _, worker_id, task_id, ok, payload, rss = message
+                with self._lock:
+                    worker = self._workers.get(worker_id)
+                    entry = worker.inflight.pop(task_id, None) if worker else None
+                    if worker:
+                        worker.handled += 1
+                        worker.rss_bytes = rss
+                if entry is not None:
+                    future = entry[0]
+                    if ok:
+                        future.set_result(payload)
+                    else:
+                        future.set_exception(RuntimeError(payload))
+
+            elif message[0] == "exit":
+                _, worker_id, reason, rss = message
+                self._retire(worker_id, reason, rss)
+
+    def _retire(self, worker_id: int, reason: str, rss: int) -> None:
+        with self._lock:
+            worker = self._workers.pop(worker_id, None)
+            if worker is None:
+                return
+            self.worker_stats.append(
+                {
+                    "worker_id": worker_id,
+                    "pid": worker.process.pid,
+                    "handled": worker.handled,
+                    "rss_mb": rss / (1024 * 1024),
+                    "reason": reason,
+                }
+            )
+            if reason != "shutdown":
+                self.recycled += 1
+            if not self._closing:
+                self._spawn()
+
+            # A worker sends all its results before "exit", so whatever is
+            # still in flight was never picked up: hand it to the others.
+            orphans = list(worker.inflight.items())
+            worker.inflight.clear()
+            # Nobody will read the leftovers; don't wait for them at exit
+            worker.task_q.cancel_join_thread()
+            for task_id, (future, args) in orphans:
+                if self._closing or not self._workers:
+                    future.set_exception(RuntimeError("PreforkPool is closed"))
+                    continue
+                target = min(self._workers.values(), key=lambda w: len(w.inflight))
+                target.inflight[task_id] = (future, args)
+                target.task_q.put((task_id, args))
+
+        worker.process.join()
+
+    def _reap_dead_workers(self) -> None:
+        """Workers that died without saying goodbye (crash, OOM kill)."""
+        with self._lock:
+            # Exit code 0 = clean exit, its "exit" message handles it
+            dead = [
+                w for w in self._workers.values()
+                if not w.process.is_alive() and w.process.exitcode != 0
+            ]
+            lost = []
+            for w in dead:
+                lost.extend(
+                    (future, w.process.pid, w.process.exitcode)
+                    for future, _ in w.inflight.values()
+                )
+                w.inflight.clear()
+
+        # We can't tell which request killed the worker, so fail them all
+        # rather than risk crashing the next worker with the same input.
+        for future, pid, exitcode in lost:
+            future.set_exception(RuntimeError(f"worker {pid} died (exit code {exitcode})"))
+        for w in dead:
+            self._retire(w.worker_id, "crashed", 0)
+
+
+# ----- Scaling benchmark -----
+#
+#   python worker_pool.py            # 1..cpu_count workers
+#   python worker_pool.py 8          # 1..8 workers
+#
+# Uses an offline handler (question parsing, a large E-utilities-style JSON
+# parse and answer building) so it measures CPU work, not network waits.
+# The master still preloads the full pipeline import set, so the RSS
+# numbers are those of real workers.
+
+_BENCH_PAYLOAD: str | None = None
+
+
+def _bench_preload() -> None:
+    global _BENCH_PAYLOAD
+    import json
+
+    preload_shared_data()
+    records = {
+        str(i): {
+            "uid": str(i),
+            "name": f"GENE{i}",
+            "description": "synthetic gene record " * 5,
+            "otheraliases": ", ".join(f"ALIAS{i}_{j}" for j in range(5)),
+            "genomicinfo": [{"chrloc": "17", "chrstart": i * 1000, "chrstop": i * 1000 + 500}],
+        }
+        for i in range(300)
+    }
+    _BENCH_PAYLOAD = json.dumps({"result": records})
+
+
+def _bench_handler(user_question: str):
+    import json
+    from answer_builder import build_answer_json
+    from question_parser import build_question_json
+
+    question_json = build_question_json(user_question)
+    summary = json.loads(_BENCH_PAYLOAD)["result"]
+    record = summary[str(len(user_question) % len(summary))]
+
+    evidence_json = {
+        "gene": {"symbol": question_json["gene"]["symbol"]},
+        "variant": question_json["variant"],
+        "omim": {"gene_id_omim": None, "diseases": []},
+        "ncbi_gene": {
+            "gene_id_ncbi": record["uid"],
+            "full_name": record["description"],
+            "summary": record["description"],
+            "chromosome": record["genomicinfo"][0]["chrloc"],
+            "synonyms": record["otheraliases"].split(", "),
+        },
+        "clinvar": None,
+    }
+    return build_answer_json(evidence_json)
+
+
+if __name__ == "__main__":
+    max_workers = int(sys.argv[1]) if len(sys.argv) > 1 else (os.cpu_count() or 1)
+    questions = [
+        "BRCA1 c.68_69delAG. Is this mutation serious?",
+        "What conditions are associated with the BRAC1 gene?",
+        "Explain what TP35 normally does.",
+        "I have a CTFR variant. What kind of risk does it carry?",
+    ] * 500
+
+    print(f"{len(questions)} requests per run (cpu_count={os.cpu_count()})\n")
+    print(
+        f"{'workers':>7}  {'req/s':>8}  {'speedup':>7}  {'recycled':>8}  "
+        "worker RSS / private (MB)"
+    )
+
+    baseline = None
+    workers = 1
+    while workers <= max_workers:
+        with PreforkPool(
+            workers=workers,
+            handler=_bench_handler,
+            max_requests=400,
+            preload=_bench_preload,
+        ) as pool:
+            pool.map(questions[:workers * 10])  # warm up
+
+            start = time.perf_counter()
+            pool.map(questions)
+            elapsed = time.perf_counter() - start
+
+            rss = []
+            for w in sorted(pool.stats(), key=lambda w: w["rss_mb"]):
+                private = private_rss_bytes(w["pid"])
+                private_mb = "?" if private is None else round(private / (1024 * 1024))
+                rss.append(f"{round(w['rss_mb'])}/{private_mb}")
+            recycled = pool.recycled
+
+        throughput = len(questions) / elapsed
+        baseline = baseline or throughput
+        print(
+            f"{workers:>7}  {throughput:>8.0f}  {throughput / baseline:>6.2f}x  "
+            f"{recycled:>8}  {' '.join(rss)}"
+        )
+        workers *= 2
+        if workers > max_workers and workers // 2 < max_workers:
+            workers = max_workers